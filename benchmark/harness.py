@@ -0,0 +1,208 @@
+# coding=utf-8
+#
+# Benchmark the parsing pipeline on synthetic statements, stage by stage:
+#
+#	fileToLines		read the first sheet into lines
+#	sections		find fund name and date, split the lines into sections
+#	positions		build positions from sections, keep HTM bonds, add ISIN
+#	outputCsv		write the upload file
+#
+# For each stage it reports wall time, throughput and peak memory. Results
+# can be saved as a baseline, later runs with the same settings are compared
+# against it and regressions are flagged. For example:
+#
+#	$ python -m trustee_report.benchmark.harness --files 20 --sections 12 --rows 500 --save
+#	$ python -m trustee_report.benchmark.harness --files 20 --sections 12 --rows 500
+#
+from trustee_report.report import fileToLines, getSections, readHeader, \
+								getPortfolioIdFromHeader, getDateFromHeader, \
+								getPositionsFromSection, addISINCode
+from trustee_report.main import outputCsv
+from trustee_report.benchmark.synthetic import writeStatements
+from trustee_report.utility import getCurrentDirectory
+from tempfile import TemporaryDirectory
+from os.path import join, exists
+import tracemalloc, time, json, os, sys
+
+
+
+def linesStage(files):
+	"""
+	[List] files => [List] lines of each file
+	"""
+	return [list(fileToLines(f)) for f in files]
+
+
+
+def sectionsStage(linesOfFiles):
+	"""
+	[List] lines of each file => [List] (portfolio, date, sections) of each file
+	"""
+	def toSections(lines):
+		header, lines = readHeader(lines)
+		return ( getPortfolioIdFromHeader(header), getDateFromHeader(header)
+			   , list(map(list, getSections(lines))))
+
+	return list(map(toSections, linesOfFiles))
+
+
+
+def positionsStage(sectionsOfFiles):
+	"""
+	[List] (portfolio, date, sections) of each file => [List] HTM positions
+	"""
+	return [ addISINCode(p.tag(Portfolio=portfolio, Date=date))
+			 for (portfolio, date, sections) in sectionsOfFiles
+			 for section in sections
+			 for p in getPositionsFromSection(section)
+			 if p['AssetType'] == 'HTMBond']
+
+
+
+def outputStage(positions):
+	"""
+	[List] positions => [List] output files, written in the current directory
+	"""
+	return outputCsv(positions)
+
+
+
+"""
+	[List] (stage name, stage function, counter), a counter gives the number
+	of items of the stage's input, used for throughput.
+"""
+stages = \
+[ ('fileToLines', linesStage, len)
+, ('sections', sectionsStage, lambda linesOfFiles: sum(map(len, linesOfFiles)))
+, ('positions', positionsStage, lambda sectionsOfFiles: \
+		sum(len(s) for (_, _, sections) in sectionsOfFiles for s in sections))
+, ('outputCsv', outputStage, len)
+]
+
+
+
+def runStages(files, measureMemory):
+	"""
+	[List] files, [Bool] measureMemory
+		=> [Dictionary] stage name => (seconds, items, peak KiB or None)
+
+	Each stage takes the output of the previous stage. Memory is measured
+	in a separate run, since tracing allocations slows things down.
+	"""
+	results = {}
+	data = files
+	for (name, stage, counter) in stages:
+		items = counter(data)
+		if measureMemory:
+			tracemalloc.start()
+
+		start = time.perf_counter()
+		data = stage(data)
+		seconds = time.perf_counter() - start
+
+		peak = None
+		if measureMemory:
+			peak = tracemalloc.get_traced_memory()[1]/1024
+			tracemalloc.stop()
+
+		results[name] = (seconds, items, peak)
+
+	return results
+
+
+
+def benchmark(files, sections, rows, fileType):
+	"""
+	[Int] files, [Int] sections, [Int] rows, [String] fileType
+		=> [Dictionary] stage name => { 'seconds', 'items', 'throughput', 'peakKiB' }
+
+	Write the synthetic statements into a temporary directory, run the stages
+	there (so the output file goes there too), then clean up.
+	"""
+	cwd = os.getcwd()
+	with TemporaryDirectory() as directory:
+		inputFiles = writeStatements(directory, files, sections, rows, fileType)
+		os.chdir(directory)
+		try:
+			timing = runStages(inputFiles, False)
+			memory = runStages(inputFiles, True)
+		finally:
+			os.chdir(cwd)
+
+	return { name: { 'seconds': timing[name][0]
+				   , 'items': timing[name][1]
+				   , 'throughput': timing[name][1]/timing[name][0]
+				   , 'peakKiB': memory[name][2]
+				   }
+			 for name in timing}
+
+
+
+def compareWithBaseline(results, baseline, tolerance):
+	"""
+	[Dictionary] results, [Dictionary] baseline, [Float] tolerance (e.g. 0.2)
+		=> [List] regressions, each one a String
+
+	A stage regresses when its time or peak memory is more than tolerance
+	above the baseline.
+	"""
+	regressions = []
+	for name in filter(lambda name: name in baseline, results):
+		for measure in ['seconds', 'peakKiB']:
+			if results[name][measure] > baseline[name][measure]*(1 + tolerance):
+				regressions.append('{0} {1}: {2:.3f} vs baseline {3:.3f}'.format(
+					name, measure, results[name][measure], baseline[name][measure]))
+
+	return regressions
+
+
+
+def showResults(results):
+	print('{0:<12} {1:>10} {2:>10} {3:>14} {4:>12}'.format(
+			'stage', 'seconds', 'items', 'items/second', 'peak KiB'))
+	for name in results:
+		r = results[name]
+		print('{0:<12} {1[seconds]:>10.3f} {1[items]:>10} {1[throughput]:>14.0f} {1[peakKiB]:>12.0f}'.format(
+				name, r))
+
+
+
+if __name__ == '__main__':
+	import argparse
+	parser = argparse.ArgumentParser(description='Benchmark parsing synthetic statements')
+	parser.add_argument('--files', type=int, default=10, help='number of files')
+	parser.add_argument('--sections', type=int, default=9, help='sections per file')
+	parser.add_argument('--rows', type=int, default=200, help='position lines per section')
+	parser.add_argument('--type', default='xlsx', choices=['xls', 'xlsx'], help='file type')
+	parser.add_argument('--baseline', default=join(getCurrentDirectory(), 'benchmark', 'baseline.json'))
+	parser.add_argument('--save', action='store_true', help='save results as the baseline')
+	parser.add_argument('--tolerance', type=float, default=0.2)
+	args = parser.parse_args()
+
+	key = 'files={0},sections={1},rows={2},type={3}'.format(
+			args.files, args.sections, args.rows, args.type)
+	results = benchmark(args.files, args.sections, args.rows, args.type)
+	print(key)
+	showResults(results)
+
+	baselines = {}
+	if exists(args.baseline):
+		with open(args.baseline) as f:
+			baselines = json.load(f)
+
+	if args.save:
+		baselines[key] = results
+		with open(args.baseline, 'w') as f:
+			json.dump(baselines, f, indent=2, sort_keys=True)
+		print('\nBaseline saved to {0}'.format(args.baseline))
+
+	elif key in baselines:
+		regressions = compareWithBaseline(results, baselines[key], args.tolerance)
+		for r in regressions:
+			print('REGRESSION {0}'.format(r))
+		if regressions:
+			sys.exit(1)
+		print('\nNo regression against baseline')
+
+	else:
+		print('\nNo baseline for these settings, use --save to create one')
@@ -0,0 +1,49 @@
+# coding=utf-8
+#
+# Benchmark peak memory and time of loading the sample files, loading the
+# whole workbook against fileToLines(), which loads only the first sheet.
+#
+#	$ python -m trustee_report.benchmark.loading
+#
+from trustee_report.report import fileToLines
+from trustee_report.utility import getCurrentDirectory
+from utils.excel import worksheetToLines
+from xlrd import open_workbook
+from os import listdir
+from os.path import join
+import tracemalloc, time
+
+
+
+# The loader before the change, loads all sheets of the workbook
+wholeWorkbookToLines = lambda file: \
+	worksheetToLines(open_workbook(file).sheet_by_index(0))
+
+
+
+def measure(loader, file, repeat=20):
+	"""
+	[Function] loader, [String] file, [Int] repeat
+		=> ([Float] peak memory in KiB, [Float] milliseconds per load)
+	"""
+	tracemalloc.start()
+	list(loader(file))
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	start = time.perf_counter()
+	for _ in range(repeat):
+		list(loader(file))
+
+	return peak/1024, (time.perf_counter() - start)/repeat*1000
+
+
+
+if __name__ == '__main__':
+	directory = join(getCurrentDirectory(), 'samples')
+	print('{0:<40} {1:>20} {2:>20}'.format('file', 'whole workbook', 'first sheet only'))
+	for fn in sorted(filter(lambda fn: fn.endswith('.xls'), listdir(directory))):
+		before = measure(wholeWorkbookToLines, join(directory, fn))
+		after = measure(fileToLines, join(directory, fn))
+		print('{0:<40} {1[0]:>7.0f} KiB {1[1]:>6.2f} ms {2[0]:>7.0f} KiB {2[1]:>6.2f} ms'.format(
+				fn, before, after))
@@ -0,0 +1,61 @@
+# coding=utf-8
+#
+# Benchmark merging positions from many files in getHTMPositionsFromFiles(),
+# the old reduce(chain, ...) merge against the flat chain.from_iterable merge.
+#
+# File parsing is replaced by synthetic positions, so only the merge is
+# measured. Run from the parent directory of trustee_report:
+#
+#	$ python -m trustee_report.benchmark.merge
+#
+from trustee_report import report
+from itertools import chain
+from functools import reduce
+from unittest.mock import patch
+import time
+
+
+
+def syntheticPositions(file, assetTypes=None, content=None, n=20):
+	"""
+	[String] file, [Iterable] assetTypes (not used), [Bytes] content (not
+	used), [Int] n
+		=> [Iterable] n synthetic HTM positions
+	"""
+	return ( report.Position( { 'Description': 'XS{0:010d} BOND {1}'.format(i, file)
+							  , 'Quantity': 1000000.0, 'AmortizedCost': 100.0}
+							, AssetType='HTMBond', Portfolio='12229', Date='2020-02-29')
+			 for i in range(n))
+
+
+
+def timeIt(func, files):
+	"""
+	[Function] func, [List] files => ([Int] positions, [Float] seconds)
+	"""
+	start = time.perf_counter()
+	count = sum(1 for _ in func(files))
+	return count, time.perf_counter() - start
+
+
+
+# The merge before the change, nests one chain per file
+nestedMerge = lambda files: \
+	reduce(chain, map(report.htmPositionsFromFile, files))
+
+
+
+if __name__ == '__main__':
+	print('{0:>8} {1:>10} {2:>16} {3:>16}'.format(
+			'files', 'positions', 'nested us/pos', 'flat us/pos'))
+
+	with patch.object(report, 'loadFile', syntheticPositions):
+		for n in [10, 100, 1000, 10000]:
+			files = ['file{0}.xls'.format(i) for i in range(n)]
+			count, flat = timeIt(report.getHTMPositionsFromFiles, files)
+			# the nested merge is quadratic, skip it where it takes minutes
+			nested = timeIt(nestedMerge, files)[1] if n <= 1000 else None
+			print('{0:>8} {1:>10} {2:>16} {3:>16.3f}'.format(
+					n, count
+				  , '-' if nested == None else '{0:.3f}'.format(nested/count*1e6)
+				  , flat/count*1e6))
@@ -0,0 +1,45 @@
+# coding=utf-8
+#
+# Benchmark the cost of per row logging in getPositionsFromSection(), with
+# logging at INFO level. The eager path formats the message for every row
+# before the logger drops it, the current path does no per row work unless
+# row tracing is switched on.
+#
+#	$ python -m trustee_report.benchmark.rowlogging
+#
+from trustee_report.report import getPositionsFromSection, compileHeaders
+from trustee_report.benchmark.section import syntheticSection, timeIt
+import logging
+
+
+
+def eagerLogging(lines):
+	"""
+	Row parsing with the message formatted for every row, as before.
+	"""
+	logger = logging.getLogger('trustee_report.report')
+	toPosition = compileHeaders(lines[1], lines[2], lines[3])
+	def logRow(line):
+		logger.debug('toPosition(): {0}'.format(line[0]))
+		return line
+
+	return map(toPosition, map(logRow, lines[4:]))
+
+
+
+noLogging = lambda lines: \
+	map(compileHeaders(lines[1], lines[2], lines[3]), lines[4:])
+
+
+
+if __name__ == '__main__':
+	logging.basicConfig(level=logging.INFO)
+	lines = syntheticSection(100000)
+
+	base = timeIt(noLogging, lines)
+	eager = timeIt(eagerLogging, lines)
+	print('100k rows, row parsing only: no logging {0:.3f}s, eager logging {1:.3f}s'.format(
+			base, eager))
+
+	print('getPositionsFromSection(): {0:.3f}s'.format(
+			timeIt(getPositionsFromSection, lines)))
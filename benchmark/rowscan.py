@@ -0,0 +1,58 @@
+# coding=utf-8
+#
+# Benchmark the row scan of a large sheet: dropping empty lines and
+# splitting the lines into sections. Before, each line went through a
+# lambda per cell to test for an empty line, then re.match() (with its
+# pattern cache lookup) to test for a section header. Now classifyRows()
+# tags each line once, with the pattern compiled in advance.
+#
+#	$ python -m trustee_report.benchmark.rowscan
+#
+from trustee_report.report import getSections, classifyRows, emptyLine, \
+									getPositionsFromSection
+from trustee_report.benchmark.synthetic import statementLines
+from trustee_report.benchmark.section import timeIt
+from utils.iter import divideToGroup
+from itertools import filterfalse
+from functools import partial
+import re
+
+
+
+oldEmptyLine = lambda line: len(line) == 0 or all(map(lambda c: c == '', line))
+
+
+
+"""
+	[Iterable] lines => [Iterable] sections, the way it was done before
+"""
+oldGetSections = lambda lines: \
+	divideToGroup( lambda line: re.match('[IVX]+\.\s+', line[0]) != None
+				 , filterfalse(oldEmptyLine, lines))
+
+
+
+if __name__ == '__main__':
+	import argparse
+	parser = argparse.ArgumentParser(description='Benchmark the row scan of a large sheet')
+	parser.add_argument('--sections', type=int, default=39, help='sections in the sheet')
+	parser.add_argument('--rows', type=int, default=25000, help='position lines per section')
+	args = parser.parse_args()
+
+	# the header lines are left out, only the sections are scanned
+	lines = list(statementLines(args.sections, args.rows))[7:]
+	print('{0} lines, {1} sections'.format(len(lines), args.sections))
+
+	old = timeIt(oldGetSections, lines)
+	new = timeIt(getSections, lines)
+	print('split into sections: before {0:.3f}s, now {1:.3f}s'.format(old, new))
+
+	old = timeIt(partial(filter, oldEmptyLine), lines)
+	new = timeIt(partial(filter, emptyLine), lines)
+	print('empty line test only: before {0:.3f}s, now {1:.3f}s'.format(old, new))
+
+	print('classifyRows() only: {0:.3f}s'.format(timeIt(classifyRows, lines)))
+
+	section = list(next(getSections(lines)))
+	print('getPositionsFromSection() of a {0} line section: {1:.3f}s'.format(
+			len(section), timeIt(getPositionsFromSection, section)))
@@ -0,0 +1,110 @@
+# coding=utf-8
+#
+# Micro benchmark of getPositionsFromSection() on a synthetic HTM bond section
+# of 100k rows, against the row parsing before headers were compiled.
+#
+#	$ python -m trustee_report.benchmark.section
+#
+from trustee_report.report import getPositionsFromSection, toNewHeader, mergeDictionary
+from utils.iter import divideToGroup
+from toolz.functoolz import compose
+from functools import partial
+from itertools import filterfalse
+import time
+
+
+
+headerLines = \
+[ ['VIII. Debt Securities - USD Held for Maturity', '', '', '', '', '', '', '', '']
+, ['', '', '', '', '票面值', '', '', '攤銷後', '', '', '總攤銷值', '', '']
+, ['項目', '', '幣值', '', 'Par', '', 'Avg', 'Amortized', '', '成本', 'Total', '', '% of']
+, ['Description', '', 'CCY', '', 'Amt', '', 'Cost ', 'Price', '', 'Cost', 'Value', '', 'Fund']
+]
+
+
+
+def syntheticSection(rows):
+	"""
+	[Int] rows => [List] lines of a HTM bond section with that many positions
+	"""
+	width = len(headerLines[1])
+	headers = [line + [''] * (width - len(line)) for line in headerLines]
+	return headers + \
+		[ [ 'XS{0:010d} BOND'.format(i), '', 'USD', '', 1000000.0, '', 99.5
+		  , 100.0 + i % 7 / 10, '', 995000.0, 1000000.0, '', 0.001]
+		  for i in range(rows)]
+
+
+
+def oldConsolidatePositionGroup(group):
+	"""
+	Consolidation before the change, one group at a time.
+	"""
+	position = group[0].copy()
+
+	if 'Quantity' in position:
+		position['Quantity'] = sum(map(lambda p: p['Quantity'], group))
+		if 'AmortizedCost' in position:
+			position['AmortizedCost'] = \
+				sum(map( lambda p: p['Quantity']*p['AmortizedCost']
+					   , group)
+				   )/position['Quantity']
+
+	return position
+
+
+
+def oldGetPositionsFromSection(lines):
+	"""
+	Row parsing before the change, zip every line with the full header list
+	and drop blank columns row by row.
+	"""
+	getHeaders = lambda line1, line2, line3: compose(
+		list
+	  , partial(map, toNewHeader)
+	  , zip
+	)(line1, line2, line3)
+
+	toPosition = lambda headers, line: compose(
+		dict
+	  , partial(filterfalse, lambda t: t[0] == ('', '', ''))
+	  , partial(zip, headers)
+	  , lambda _, line: line
+	)(headers, line)
+
+	countEmptyDictValue = lambda d: sum(1 if d[key] == '' else 0 for key in d)
+
+	return \
+	compose(
+		partial(map, partial(mergeDictionary, {'AssetType': 'HTMBond'}))
+	  , partial(map, oldConsolidatePositionGroup)
+	  , partial(divideToGroup, lambda p: p['Description'] != '')
+	  , partial(filterfalse, lambda p: countEmptyDictValue(p) > 2)
+	  , partial(map, partial(toPosition, getHeaders(lines[1], lines[2], lines[3])))
+	  , lambda lines: lines[4:]
+	)(lines)
+
+
+
+def timeIt(func, lines, repeat=3):
+	"""
+	[Function] func, [List] lines => [Float] best seconds of a few runs
+	"""
+	def once():
+		start = time.perf_counter()
+		for _ in func(lines):
+			pass
+		return time.perf_counter() - start
+
+	return min(once() for _ in range(repeat))
+
+
+
+if __name__ == '__main__':
+	lines = syntheticSection(100000)
+	assert list(oldGetPositionsFromSection(lines)) == list(getPositionsFromSection(lines))
+
+	before = timeIt(oldGetPositionsFromSection, lines)
+	after = timeIt(getPositionsFromSection, lines)
+	print('100k rows: before {0:.3f}s, after {1:.3f}s, speed up {2:.1f}x'.format(
+			before, after, before/after))
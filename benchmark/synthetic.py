@@ -0,0 +1,138 @@
+# coding=utf-8
+#
+# Generate synthetic CL Trustee statements with the layout readFile()
+# expects: title lines, fund name line, valuation period line, then Roman
+# numeral sections, each with three header lines, position lines and a sub
+# total line, and a grand total line at the end.
+#
+# .xlsx files are written by openpyxl, .xls files by xlwt (an .xls sheet
+# holds at most 65,536 rows).
+#
+from os.path import join
+
+
+
+fundName = 'CLT-CLI HK BR (Class A-HK) Trust Fund  (Bond)'	# portfolio 12734
+
+
+
+"""
+	Three header lines of each section type, and a function to make the
+	position line number i of that section type.
+"""
+cashHeaders = \
+[ ['', '', '', '', 'Total']
+, ['項目 & 戶口號碼', '', '幣值', '成本', 'Mkt']
+, ['Description & Account No.', '', 'CCY', 'Cost', 'Value']
+]
+
+cashLine = lambda i: \
+	['Bank of China (Hong Kong)\nCurrent Account\n{0:012d}'.format(i), '', 'USD'
+	, 1000.0 + i, 1000.0 + i]
+
+
+bondHeaders = \
+[ ['', '', '', '', '票面值', '平均成本', '攤銷後', '', '總攤銷值']
+, ['項目', '', '幣值', '', 'Par', 'Avg', 'Amortized', '成本', 'Total']
+, ['Description', '', 'CCY', '', 'Amt', 'Cost ', 'Price', 'Cost', 'Value']
+]
+
+bondLine = lambda i: \
+	['XS{0:010d} SYNTHETIC BOND'.format(i), '', 'USD', '', 1000000.0, 99.5
+	, 100.0 + i % 13 / 10, 995000.0, 1000000.0 + i % 13 * 1000]
+
+
+sectionTypes = \
+[ ('Cash - USD (現金 - 美元)', cashHeaders, cashLine)
+, ('Debt Securities - USD Held for Maturity (持有至到期債務票據 - 美元)', bondHeaders, bondLine)
+, ('Debt Securities - USD Available for Sales (可供出售債務票據 - 美元)', bondHeaders, bondLine)
+]
+
+
+
+def romanNumeral(n):
+	"""
+	[Int] n (> 0) => [String] n in Roman numerals, e.g., 14 => 'XIV'
+	"""
+	numerals = [ (1000, 'M'), (900, 'CM'), (500, 'D'), (400, 'CD'), (100, 'C')
+			   , (90, 'XC'), (50, 'L'), (40, 'XL'), (10, 'X'), (9, 'IX'), (5, 'V')
+			   , (4, 'IV'), (1, 'I')]
+	result = ''
+	for (value, numeral) in numerals:
+		while n >= value:
+			result = result + numeral
+			n = n - value
+
+	return result
+
+
+
+def statementLines(sections, rows):
+	"""
+	[Int] sections, [Int] rows (position lines per section)
+		=> [Iterable] lines of a synthetic statement, section types rotate
+			among cash, HTM bond and AFS bond.
+
+	At most 39 sections, readFile() only knows section numbers made of I, V
+	and X.
+	"""
+	if sections > 39:
+		raise ValueError('statementLines(): at most 39 sections')
+
+	yield ['', '中國人壽信托有限公司']
+	yield ['', 'CHINA LIFE TRUSTEES LIMITED']
+	yield ['', 'PORTFOLIO VALUATION REPORT']
+	yield []
+	yield ['Fund Name: {0}'.format(fundName)]
+	yield ['Valuation Period: From 01/02/2020 to 29/02/2020']
+	yield []
+
+	for n in range(sections):
+		(title, headers, toLine) = sectionTypes[n % len(sectionTypes)]
+		yield ['{0}. {1}'.format(romanNumeral(n+1), title)]
+		yield from headers
+		yield []
+		yield from map(toLine, range(n*rows, (n+1)*rows))
+		yield [''] * (len(headers[0]) - 1) + [1000000.0*rows]	# sub total
+		yield []
+
+	yield ['Total (總額)', '', '', '', 1000000.0*rows*sections]
+
+
+
+def writeStatement(file, sections, rows):
+	"""
+	[String] file (.xls or .xlsx), [Int] sections, [Int] rows => [String] file
+
+	Side effect: write a synthetic statement into the file.
+	"""
+	if file.endswith('.xlsx'):
+		from openpyxl import Workbook
+		wb = Workbook(write_only=True)
+		ws = wb.create_sheet()
+		for line in statementLines(sections, rows):
+			ws.append(line)
+		wb.save(file)
+
+	else:
+		from xlwt import Workbook
+		wb = Workbook()
+		ws = wb.add_sheet('Sheet1')
+		for (row, line) in enumerate(statementLines(sections, rows)):
+			for (column, value) in enumerate(line):
+				ws.write(row, column, value)
+		wb.save(file)
+
+	return file
+
+
+
+def writeStatements(directory, files, sections, rows, fileType='xlsx'):
+	"""
+	[String] directory, [Int] files, [Int] sections, [Int] rows
+	[String] fileType ('xls' or 'xlsx')
+		=> [List] synthetic statement files written into the directory
+	"""
+	return [ writeStatement( join(directory, 'statement{0:05d}.{1}'.format(i, fileType))
+						   , sections, rows)
+			 for i in range(files)]
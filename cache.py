@@ -0,0 +1,118 @@
+# coding=utf-8
+#
+# On disk cache for parsed files. An entry is keyed by the content hash of
+# the input file plus the parser version, so a rerun on unchanged files only
+# costs a hash of each file instead of parsing it again.
+#
+import os, hashlib, pickle, time
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+def fileHash(file):
+	"""
+	[String] file => [String] sha256 hex digest of the file content
+	"""
+	h = hashlib.sha256()
+	with open(file, 'rb') as f:
+		for block in iter(lambda: f.read(1024*1024), b''):
+			h.update(block)
+
+	return h.hexdigest()
+
+
+
+def readThroughCache(directory, version, parse, file, content=None):
+	"""
+	[String] directory (cache directory)
+	[String] version (parser version)
+	[Function] parse ([String] file => [Iterable] positions)
+	[String] file
+	[Bytes] content (optional, the file's content already in memory)
+		=> [List] positions
+
+	Return the cached positions of the file if there is an entry for its
+	content and parser version, otherwise parse the file and save the
+	positions into the cache.
+	"""
+	digest = fileHash(file) if content == None else hashlib.sha256(content).hexdigest()
+	entry = os.path.join(directory, '{0}-{1}.pickle'.format(digest, version))
+	positions = loadEntry(entry)
+	if positions != None:
+		logger.debug('readThroughCache(): cache hit {0}'.format(file))
+		return positions
+
+	positions = list(parse(file))
+	saveEntry(entry, positions)
+	return positions
+
+
+
+def loadEntry(entry):
+	"""
+	[String] entry (cache file) => [List] positions, or None if the entry
+		does not exist or cannot be read.
+
+	Side effect: touch the entry so that it is the last to be evicted.
+	"""
+	try:
+		with open(entry, 'rb') as f:
+			positions = pickle.load(f)
+	except FileNotFoundError:
+		return None
+	except Exception as e:
+		logger.warning('loadEntry(): ignore bad cache entry {0}: {1}'.format(entry, repr(e)))
+		return None
+
+	os.utime(entry)
+	return positions
+
+
+
+def saveEntry(entry, positions):
+	"""
+	[String] entry (cache file), [List] positions => [String] entry
+
+	Side effect: write the positions into the entry, through a temporary file
+	so that a crashed run does not leave a half written entry.
+	"""
+	os.makedirs(os.path.dirname(entry), exist_ok=True)
+	tempFile = '{0}.{1}.tmp'.format(entry, os.getpid())
+	with open(tempFile, 'wb') as f:
+		pickle.dump(positions, f, pickle.HIGHEST_PROTOCOL)
+
+	os.replace(tempFile, entry)
+	return entry
+
+
+
+def pruneCache(directory, maxAge, maxSize):
+	"""
+	[String] directory (cache directory)
+	[Float] maxAge (seconds)
+	[Int] maxSize (bytes)
+		=> [Int] number of entries evicted
+
+	Side effect: delete entries not used for more than maxAge, then delete
+	the least recently used entries until the cache is no larger than maxSize.
+	"""
+	if not os.path.isdir(directory):
+		return 0
+
+	entries = sorted( ( (e.stat().st_mtime, e.stat().st_size, e.path)
+					  	for e in os.scandir(directory) if e.name.endswith('.pickle'))
+					, reverse=True)		# most recently used first
+
+	now = time.time()
+	totalSize = 0
+	evicted = 0
+	for (mtime, size, path) in entries:
+		totalSize = totalSize + size
+		if now - mtime > maxAge or totalSize > maxSize:
+			os.remove(path)
+			totalSize = totalSize - size
+			evicted = evicted + 1
+
+	logger.debug('pruneCache(): {0} entries evicted'.format(evicted))
+	return evicted
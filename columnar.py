@@ -0,0 +1,153 @@
+# coding=utf-8
+#
+# Columnar view of HTM positions: each field is a NumPy array, so totals by
+# portfolio, currency etc. over millions of positions are vectorized instead
+# of walking a list of dictionaries.
+#
+# String columns are dictionary encoded: columns['Portfolio'] is an array of
+# integer codes into columns['categories']['Portfolio'], use decode() to get
+# the strings back. Grouping then works on integers only, without sorting
+# strings.
+#
+from trustee_report.report import getHTMPositionsFromFiles
+import numpy as np
+
+
+
+stringColumns = ('Portfolio', 'Date', 'ISIN', 'Currency', 'AssetType')
+numberColumns = ('Quantity', 'AmortizedCost')
+
+
+
+def toColumns(positions):
+	"""
+	[Iterable] positions => [Dictionary] columns (column name => [Array] values,
+		plus 'categories' => [Dictionary] column name => [Array] strings)
+	"""
+	codeMaps = {name: {} for name in stringColumns}
+	values = {name: [] for name in stringColumns + numberColumns}
+	for p in positions:
+		for name in stringColumns:
+			codeMap = codeMaps[name]
+			values[name].append(codeMap.setdefault(p[name], len(codeMap)))
+		for name in numberColumns:
+			values[name].append(p[name])
+
+	columns = {name: np.array(values[name], dtype=np.int64) for name in stringColumns}
+	columns.update({name: np.array(values[name], dtype=float) for name in numberColumns})
+	columns['categories'] = \
+		{name: np.array(list(codeMaps[name]), dtype=str) for name in stringColumns}
+
+	return columns
+
+
+
+def getHTMColumnsFromFiles(files, workers=0):
+	"""
+	[Iterable] files (CL trustee excel files)
+	[Int] workers (same as getHTMPositionsFromFiles())
+		=> [Dictionary] columns of the HTM positions from these files
+	"""
+	return toColumns(getHTMPositionsFromFiles(files, workers))
+
+
+
+"""
+	[Dictionary] columns, [String] name (a string column)
+		=> [Array] the strings of that column
+"""
+decode = lambda columns, name: \
+	columns['categories'][name][columns[name]]
+
+
+
+def groupIndex(columns, keys):
+	"""
+	[Dictionary] columns, [Tuple] keys (string columns to group by)
+		=> ( [Dictionary] key column name => [Array] codes, one row per group
+		   , [Array] group number of each row in columns
+		   )
+
+	The key codes are combined into one integer per row. When the number of
+	possible combinations is small, groups are found with bincount in linear
+	time, otherwise by sorting the combined integers.
+	"""
+	sizes = [len(columns['categories'][k]) for k in keys]
+	combined = np.zeros(len(columns[keys[0]]), dtype=np.int64)
+	for (k, size) in zip(keys, sizes):
+		combined = combined * size + columns[k]
+
+	space = int(np.prod(sizes, dtype=np.int64))
+	if space <= 4*len(combined) + 1024:
+		present = np.bincount(combined, minlength=space) > 0
+		groupKeys = np.flatnonzero(present)
+		index = (np.cumsum(present) - 1)[combined]
+	else:
+		groupKeys, index = np.unique(combined, return_inverse=True)
+
+	codes = {}
+	for (k, size) in reversed(list(zip(keys, sizes))):
+		codes[k] = groupKeys % size
+		groupKeys = groupKeys // size
+
+	return {k: codes[k] for k in keys}, index.reshape(-1)
+
+
+
+def groupSum(columns, keys, values):
+	"""
+	[Dictionary] columns, [Tuple] keys (string columns to group by)
+	[Array] values (one value per row)
+		=> [Dictionary] key columns (as strings) plus a 'Sum' column, one
+			row per group
+	"""
+	codes, index = groupIndex(columns, keys)
+	groups = {k: columns['categories'][k][codes[k]] for k in keys}
+	groups['Sum'] = np.bincount(index, weights=values, minlength=len(codes[keys[0]]))
+	return groups
+
+
+
+"""
+	[Dictionary] columns => [Array] amortized value of each position, i.e.,
+		quantity (par amount) times the amortized price per 100 par.
+"""
+amortizedValue = lambda columns: \
+	columns['Quantity'] * columns['AmortizedCost'] / 100
+
+
+
+"""
+	[Dictionary] columns => [Dictionary] total amortized value by portfolio
+		and currency, columns are Portfolio, Currency and Sum.
+"""
+totalByPortfolioCurrency = lambda columns: \
+	groupSum(columns, ('Portfolio', 'Currency'), amortizedValue(columns))
+
+
+
+def consolidate(columns):
+	"""
+	[Dictionary] columns => [Dictionary] columns with one row per (Portfolio,
+		Date, ISIN), quantities added up and amortized cost averaged weighted
+		by quantity.
+
+	Other columns take the value of the first row of the group.
+	"""
+	codes, index = groupIndex(columns, ('Portfolio', 'Date', 'ISIN'))
+	n = len(codes['ISIN'])
+	quantity = np.bincount(index, weights=columns['Quantity'], minlength=n)
+	weighted = np.bincount( index
+						  , weights=columns['Quantity']*columns['AmortizedCost']
+						  , minlength=n)
+
+	# row number of the first row in each group
+	first = np.full(n, len(index))
+	np.minimum.at(first, index, np.arange(len(index)))
+
+	result = {name: columns[name][first] for name in stringColumns}
+	result.update(codes)
+	result['Quantity'] = quantity
+	result['AmortizedCost'] = weighted / quantity
+	result['categories'] = columns['categories']
+	return result
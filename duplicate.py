@@ -0,0 +1,124 @@
+# coding=utf-8
+#
+# Trustees resend corrected statements, so there can be two files for the
+# same portfolio and valuation date. Only one of them is kept: a file is
+# for the portfolio and date in its header, the first file of each
+# (portfolio, date) is kept, even if it has no HTM positions, and all
+# positions of the later ones are dropped and reported, as a conflict if
+# the kept file has a different price.
+#
+# Which file comes first is decided by a policy:
+#
+#	newest		the file modified last
+#	oldest		the file modified first
+#	first		the first file by file name
+#	last		the last file by file name
+#	none		keep all files, no index
+#
+from trustee_report.report import getHTMPositionListsFromFiles, getHTMPositionsFromFiles, \
+								getHTMPositionListsAndErrorsFromFiles
+from itertools import chain
+import os
+
+
+
+policies = \
+{ 'newest': lambda files: sorted(files, key=lambda f: (os.path.getmtime(f), f), reverse=True)
+, 'oldest': lambda files: sorted(files, key=lambda f: (os.path.getmtime(f), f))
+, 'first': lambda files: sorted(files)
+, 'last': lambda files: sorted(files, reverse=True)
+}
+
+
+
+def orderFiles(files, keep):
+	"""
+	[Iterable] files, [String] keep (policy name) => [List] files, the one
+		to keep first
+	"""
+	if not keep in policies:
+		raise ValueError('orderFiles(): unknown policy {0}'.format(keep))
+
+	return policies[keep](files)
+
+
+
+def keepFiles(filePositions, duplicates):
+	"""
+	[Iterable] (file, (portfolio, date), [List] positions), the file to keep
+		first, [List] duplicates
+		=> [Iterable] (file, (portfolio, date), [List] positions), only the
+			first file of each (portfolio, date)
+
+	Side effect: for each position of a file dropped, append to duplicates a
+	tuple (portfolio, date, ISIN, file kept, price kept, file dropped, price
+	dropped). The price kept is None if the file kept has no such ISIN.
+	"""
+	kept = {}	# (portfolio, date) => (file, {ISIN: price})
+	for (file, key, positions) in filePositions:
+		if not key in kept:
+			kept[key] = (file, {p['ISIN']: p['AmortizedCost'] for p in positions})
+			yield (file, key, positions)
+		else:
+			(keptFile, prices) = kept[key]
+			duplicates.extend(map( lambda p: key + ( p['ISIN'], keptFile, prices.get(p['ISIN'])
+												   , file, p['AmortizedCost'])
+								 , positions))
+
+
+
+"""
+	[Iterable] (file, (portfolio, date), [List] positions), the file to keep
+		first, [List] duplicates
+		=> [Iterable] positions of the files kept (see keepFiles())
+"""
+dropDuplicates = lambda filePositions, duplicates: \
+	chain.from_iterable(map(lambda t: t[2], keepFiles(filePositions, duplicates)))
+
+
+
+"""
+	[Tuple] duplicate (from keepFiles()) => [Bool] does the file kept have a
+		different price for the ISIN
+"""
+isConflict = lambda d: d[4] != None and d[4] != d[6]
+
+
+
+def getUniqueHTMPositionsFromFiles(files, keep, workers=0):
+	"""
+	[Iterable] files (CL trustee excel files), [String] keep (policy name)
+	[Int] workers (same as getHTMPositionsFromFiles())
+		=> ( [Iterable] HTM positions, of one file per (portfolio, date)
+		   , [List] duplicates dropped (see keepFiles()), filled in as the
+		   	 positions are iterated
+		   )
+	"""
+	duplicates = []
+	if keep == 'none':
+		return getHTMPositionsFromFiles(files, workers), duplicates
+
+	return dropDuplicates( getHTMPositionListsFromFiles(orderFiles(files, keep), workers)
+						 , duplicates), duplicates
+
+
+
+def getUniqueHTMPositionsAndErrorsFromFiles(files, keep, workers=0):
+	"""
+	[Iterable] files (CL trustee excel files), [String] keep (policy name)
+	[Int] workers (same as getHTMPositionsFromFiles())
+		=> ( [List] HTM positions, of one good file per (portfolio, date)
+		   , [List] duplicates dropped (see keepFiles())
+		   , [List] ParseError of each file that fails
+		   )
+
+	Same as getUniqueHTMPositionsFromFiles(), but a bad file does not stop
+	the others, nor does it take part in choosing the file to keep.
+	"""
+	duplicates = []
+	(filePositions, errors) = getHTMPositionListsAndErrorsFromFiles(
+								files if keep == 'none' else orderFiles(files, keep), workers)
+	positions = chain.from_iterable(map(lambda t: t[2], filePositions)) if keep == 'none' \
+				else dropDuplicates(filePositions, duplicates)
+
+	return (list(positions), duplicates, errors)
@@ -0,0 +1,145 @@
+# coding=utf-8
+#
+# History of HTM prices, kept in a SQLite database. Each run appends its
+# positions, one row per (portfolio, ISIN, valuation date), so the price
+# history of a bond can be looked up without reading old statements again.
+#
+# To show the history of a bond with month over month changes, do:
+#
+#	$ python -m trustee_report.history --portfolio 12630 --isin HK0000175916
+#
+import sqlite3
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+schema = '''
+CREATE TABLE IF NOT EXISTS htm_price
+( portfolio TEXT NOT NULL
+, isin TEXT NOT NULL
+, date TEXT NOT NULL
+, currency TEXT
+, quantity REAL
+, amortized_cost REAL
+, PRIMARY KEY (portfolio, isin, date)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS htm_price_date ON htm_price (date, portfolio);
+'''
+
+# positions inserted in one statement
+batchSize = 1000
+
+
+
+def openStore(file):
+	"""
+	[String] file (SQLite database) => [Connection] connection, the table and
+		indexes are created if not there yet.
+	"""
+	connection = sqlite3.connect(file)
+	connection.executescript(schema)
+	return connection
+
+
+
+toRow = lambda p: \
+	(p['Portfolio'], p['ISIN'], p['Date'], p['Currency'], p['Quantity'], p['AmortizedCost'])
+
+
+
+def appendPositions(file, positions):
+	"""
+	[String] file (SQLite database), [Iterable] HTM positions
+		=> [Iterable] the same positions
+
+	Side effect: the positions are written into the database as they pass,
+	in batches. A position replaces the one of the same portfolio, ISIN and
+	date already there (a statement read again). Nothing is written if the
+	positions do not come to the end, e.g., a file fails.
+	"""
+	connection = openStore(file)
+	insert = 'INSERT OR REPLACE INTO htm_price VALUES (?, ?, ?, ?, ?, ?)'
+	try:
+		with connection:
+			batch = []
+			for p in positions:
+				batch.append(toRow(p))
+				if len(batch) == batchSize:
+					connection.executemany(insert, batch)
+					batch = []
+				yield p
+
+			connection.executemany(insert, batch)
+	finally:
+		connection.close()
+
+
+
+def getHistory(connection, portfolio, isin, start=None, end=None):
+	"""
+	[Connection] connection, [String] portfolio, [String] isin
+	[String] start, end (optional, yyyy-mm-dd, both inclusive)
+		=> [List] (date, quantity, amortized cost), by date
+	"""
+	return connection.execute(
+		'SELECT date, quantity, amortized_cost FROM htm_price '
+		'WHERE portfolio = ? AND isin = ? AND date BETWEEN ? AND ? ORDER BY date'
+	  , (portfolio, isin, start or '', end or '9999')).fetchall()
+
+
+
+def getMonthOverMonth(connection, portfolio, isin, start=None, end=None):
+	"""
+	[Connection] connection, [String] portfolio, [String] isin
+	[String] start, end (optional, yyyy-mm-dd, both inclusive)
+		=> [List] (date, amortized cost, previous amortized cost, change), by
+			date. Previous is the valuation date before, None for the first.
+	"""
+	return connection.execute(
+		'SELECT date, cost, previous, cost - previous FROM '
+		'( SELECT date, amortized_cost AS cost'
+		'       , LAG(amortized_cost) OVER (ORDER BY date) AS previous'
+		'  FROM htm_price WHERE portfolio = ? AND isin = ?) '
+		'WHERE date BETWEEN ? AND ? ORDER BY date'
+	  , (portfolio, isin, start or '', end or '9999')).fetchall()
+
+
+
+def getDateDiff(connection, portfolio, date1, date2):
+	"""
+	[Connection] connection, [String] portfolio, [String] date1, date2
+		=> [List] (isin, amortized cost on date1, amortized cost on date2,
+			change), for every ISIN held on either date, by ISIN. The cost is
+			None on a date the ISIN is not held.
+	"""
+	return connection.execute(
+		'SELECT isin, MAX(CASE WHEN date = ? THEN amortized_cost END) AS cost1'
+		'     , MAX(CASE WHEN date = ? THEN amortized_cost END) AS cost2'
+		'     , MAX(CASE WHEN date = ? THEN amortized_cost END)'
+		'       - MAX(CASE WHEN date = ? THEN amortized_cost END) '
+		'FROM htm_price WHERE date IN (?, ?) AND portfolio = ? '
+		'GROUP BY isin ORDER BY isin'
+	  , (date1, date2, date2, date1, date1, date2, portfolio)).fetchall()
+
+
+
+if __name__ == '__main__':
+	from trustee_report.utility import getHistoryFile
+	import argparse
+	parser = argparse.ArgumentParser(description='Show the HTM price history of a bond')
+	parser.add_argument('--portfolio', required=True)
+	parser.add_argument('--isin', required=True)
+	parser.add_argument('--start', help='yyyy-mm-dd')
+	parser.add_argument('--end', help='yyyy-mm-dd')
+	args = parser.parse_args()
+
+	connection = openStore(getHistoryFile())
+	print('{0:<12} {1:>14} {2:>14} {3:>12}'.format('date', 'amortized', 'previous', 'change'))
+	for (date, cost, previous, change) in getMonthOverMonth(
+			connection, args.portfolio, args.isin, args.start, args.end):
+		print('{0:<12} {1:>14.6f} {2:>14} {3:>12}'.format(
+				date, cost
+			  , '' if previous == None else '{0:.6f}'.format(previous)
+			  , '' if change == None else '{0:.6f}'.format(change)))
@@ -0,0 +1,197 @@
+# coding=utf-8
+#
+# Incremental run: keep a manifest of the files already processed, parse only
+# new or changed files, and output only the HTM prices that changed.
+#
+# The manifest is a JSON file, one entry per input file:
+#
+#	{ 'mtime', 'size', 'hash', 'portfolio', 'date'
+#	, 'prices': { ISIN: amortized cost }
+#	, 'dropped': True if another file of the same portfolio and date is kept
+#	}
+#
+from trustee_report.report import getHTMPositionListsFromFiles
+from trustee_report.duplicate import keepFiles, orderFiles
+from trustee_report.cache import fileHash
+from os.path import exists
+import json, os
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+def loadManifest(manifestFile):
+	"""
+	[String] manifest file => [Dictionary] manifest (empty if no such file)
+	"""
+	if not exists(manifestFile):
+		return {}
+
+	with open(manifestFile) as f:
+		return json.load(f)
+
+
+
+def saveManifest(manifestFile, manifest):
+	"""
+	[String] manifest file, [Dictionary] manifest => [String] manifest file
+
+	Side effect: write the manifest, through a temporary file so that a
+	crashed run does not leave a broken manifest.
+	"""
+	tempFile = manifestFile + '.tmp'
+	with open(tempFile, 'w') as f:
+		json.dump(manifest, f, indent=2, sort_keys=True)
+
+	os.replace(tempFile, manifestFile)
+	return manifestFile
+
+
+
+def isUnchanged(file, entry):
+	"""
+	[String] file, [Dictionary] manifest entry of the file (or None)
+		=> [Bool] whether the file is the same as when it was processed
+
+	Same modified time and size means unchanged without reading the file.
+	Otherwise the content hash decides, e.g., a file copied again with the
+	same content is unchanged.
+	"""
+	if entry == None:
+		return False
+
+	stat = os.stat(file)
+	if (stat.st_mtime, stat.st_size) == (entry['mtime'], entry['size']):
+		return True
+
+	return stat.st_size == entry['size'] and fileHash(file) == entry['hash']
+
+
+
+def newOrChangedFiles(files, manifest):
+	"""
+	[Iterable] files, [Dictionary] manifest => [List] files to be processed
+	"""
+	return list(filter(lambda f: not isUnchanged(f, manifest.get(f)), files))
+
+
+
+def newEntry(file, key, positions):
+	"""
+	[String] file, [Tuple] (portfolio, date) from the header of the file
+	[List] HTM positions of the file
+		=> [Dictionary] manifest entry
+
+	The portfolio and date are kept even if the file has no HTM positions.
+	"""
+	stat = os.stat(file)
+	return { 'mtime': stat.st_mtime
+		   , 'size': stat.st_size
+		   , 'hash': fileHash(file)
+		   , 'portfolio': key[0]
+		   , 'date': key[1]
+		   , 'prices': {p['ISIN']: p['AmortizedCost'] for p in positions}
+		   }
+
+
+
+def priceIndex(manifest):
+	"""
+	[Dictionary] manifest => [Dictionary] (portfolio, date, ISIN) => amortized cost
+
+	Files dropped as duplicates are left out.
+	"""
+	return { (entry['portfolio'], entry['date'], isin): entry['prices'][isin]
+			 for entry in manifest.values() if not entry.get('dropped', False)
+			 for isin in entry['prices']}
+
+
+
+def entryPositions(entry):
+	"""
+	[Dictionary] manifest entry => [List] HTM positions, with only the fields
+		needed to choose the file to keep
+	"""
+	return [ {'Portfolio': entry['portfolio'], 'Date': entry['date'], 'ISIN': isin
+			 , 'AmortizedCost': entry['prices'][isin]}
+			 for isin in entry['prices']]
+
+
+
+def keepChangedFiles(filePositions, manifest, keep, duplicates):
+	"""
+	[List] (file, (portfolio, date), [List] HTM positions) of the new or
+	changed files, [Dictionary] manifest, with entries of those files
+	[String] keep (policy name, see duplicate.py), [List] duplicates
+		=> [List] (file, (portfolio, date), [List] HTM positions) of the new
+			or changed files that are kept
+
+	Files processed in earlier runs, and still there, take part through
+	their manifest entries, so that a resubmitted statement is weighed
+	against the one processed before. An entry without a portfolio (from a
+	manifest written before entries always had one) does not take part.
+
+	Side effect: mark each of these manifest entries as dropped or not,
+	append to duplicates the positions dropped (see keepFiles()) of each
+	(portfolio, date) that a new or changed file is for.
+	"""
+	changed = set(map(lambda t: t[0], filePositions))
+	candidates = dict( [ ( file
+						 , ( file, (manifest[file]['portfolio'], manifest[file]['date'])
+						   , entryPositions(manifest[file])))
+						 for file in manifest
+						 if not file in changed and exists(file)
+						 and manifest[file]['portfolio'] != None]
+					 + list(map(lambda t: (t[0], t), filePositions)))
+
+	dropped = []
+	kept = set(map( lambda t: t[0]
+				  , keepFiles(map(candidates.get, orderFiles(candidates, keep)), dropped)))
+	for file in candidates:
+		manifest[file]['dropped'] = not file in kept
+
+	duplicates.extend(filter(lambda d: d[3] in changed or d[5] in changed, dropped))
+	return list(filter(lambda t: t[0] in kept, filePositions))
+
+
+
+def runIncremental(files, manifestFile, workers=0, keep='none', duplicates=None):
+	"""
+	[Iterable] files, [String] manifest file, [Int] workers
+	[String] keep (which file to keep when files have the same portfolio
+		and date, see duplicate.py, 'none' means keep all)
+	[List] duplicates (optional)
+		=> [List] HTM positions whose price is new or changed
+
+	Only the new or changed files are parsed. A position is in the result
+	if its file is kept, and there is no price for its (portfolio, date,
+	ISIN) in the manifest yet, or the price is different.
+
+	Side effect: update the manifest file, append positions dropped to
+	duplicates (see keepChangedFiles()).
+	"""
+	manifest = loadManifest(manifestFile)
+	changedFiles = newOrChangedFiles(files, manifest)
+	logger.info('runIncremental(): {0} new or changed files'.format(len(changedFiles)))
+
+	prices = priceIndex(manifest)
+	filePositions = list(getHTMPositionListsFromFiles(changedFiles, workers))
+	for (file, key, positions) in filePositions:
+		manifest[file] = newEntry(file, key, positions)
+
+	if keep != 'none':
+		filePositions = keepChangedFiles( filePositions, manifest, keep
+										, [] if duplicates == None else duplicates)
+
+	delta = []
+	for (file, _, positions) in filePositions:
+		for p in positions:
+			key = (p['Portfolio'], p['Date'], p['ISIN'])
+			if prices.get(key) != p['AmortizedCost']:
+				delta.append(p)
+				prices[key] = p['AmortizedCost']
+
+	if changedFiles != []:
+		saveManifest(manifestFile, manifest)
+
+	return delta
@@ -0,0 +1,169 @@
+# coding=utf-8
+#
+# Timing and counters for the readFile() => getHTMPositionsFromFiles() =>
+# outputCsv() pipeline, to find out where the time of a slow run goes.
+#
+# Instrumentation is off by default. When off, timed() and counted() return
+# the iterable they are given, so the only cost is one flag check per file
+# or section, nothing per row.
+#
+# The pipeline is lazy, a stage's iterator is pulled by the stage after it,
+# so the time of a stage includes the stages it pulls from ('seconds'),
+# 'selfSeconds' excludes them. Statistics of worker processes (parallel
+# parsing) are not collected.
+#
+import json, time
+from collections import defaultdict
+
+
+
+enabled = False
+
+
+
+def newStats():
+	return { 'stages': defaultdict(lambda: {'seconds': 0.0, 'selfSeconds': 0.0, 'calls': 0})
+		   , 'files': defaultdict(lambda: defaultdict(int))
+		   , 'portfolios': defaultdict(lambda: defaultdict(int))
+		   }
+
+stats = newStats()
+
+# time spent in inner stages, one entry per stage being timed
+childTime = []
+
+
+
+def enable():
+	global enabled
+	enabled = True
+
+
+
+def disable():
+	global enabled
+	enabled = False
+
+
+
+def reset():
+	global stats
+	stats = newStats()
+	del childTime[:]
+
+
+
+def enter():
+	"""
+	=> [Float] start time of a stage
+	"""
+	childTime.append(0.0)
+	return time.perf_counter()
+
+
+
+def leave(stage, start):
+	"""
+	[String] stage, [Float] start time => [Float] seconds spent in the stage
+	"""
+	seconds = time.perf_counter() - start
+	inner = childTime.pop()
+	if childTime != []:
+		childTime[-1] = childTime[-1] + seconds
+
+	s = stats['stages'][stage]
+	s['seconds'] = s['seconds'] + seconds
+	s['selfSeconds'] = s['selfSeconds'] + seconds - inner
+	return seconds
+
+
+
+def timeCall(stage, func, *args, **kwargs):
+	"""
+	[String] stage, [Function] func, args => func(*args, **kwargs)
+
+	Side effect: add the time of the call to the stage.
+	"""
+	if not enabled:
+		return func(*args, **kwargs)
+
+	start = enter()
+	try:
+		return func(*args, **kwargs)
+	finally:
+		leave(stage, start)
+		stats['stages'][stage]['calls'] += 1
+
+
+
+def timed(stage, iterable, file=None):
+	"""
+	[String] stage, [Iterable] iterable, [String] file (optional)
+		=> [Iterable] the same items
+
+	Side effect: add the time spent getting the items to the stage, and to
+	the file's 'seconds' if a file is given.
+	"""
+	return timedIterator(stage, iterable, file) if enabled else iterable
+
+
+
+def timedIterator(stage, iterable, file):
+	stats['stages'][stage]['calls'] += 1
+	it = iter(iterable)
+	while True:
+		start = enter()
+		try:
+			x = next(it)
+		except StopIteration:
+			return
+		finally:
+			seconds = leave(stage, start)
+			if file != None:
+				stats['files'][file]['seconds'] += seconds
+
+		yield x
+
+
+
+def counted(iterable, group, key, name):
+	"""
+	[Iterable] iterable
+	[String] group ('files' or 'portfolios'), [String] key (file or portfolio)
+	[String] name (counter name, e.g., 'rows')
+		=> [Iterable] the same items
+
+	Side effect: count the items into stats[group][key][name].
+	"""
+	return countedIterator(iterable, stats[group][key], name) if enabled else iterable
+
+
+
+def countedIterator(iterable, counters, name):
+	counters[name] += 0		# show the counter even when there is no item
+	for x in iterable:
+		counters[name] += 1
+		yield x
+
+
+
+def countPositions(file, portfolio, positions):
+	"""
+	[String] file, [String] portfolio, [Iterable] positions
+		=> [Iterable] the same positions, counted for both file and portfolio
+	"""
+	return counted( counted(positions, 'files', file, 'positions')
+				  , 'portfolios', portfolio, 'positions')
+
+
+
+def dumpJson(file):
+	"""
+	[String] file => [String] file
+
+	Side effect: write the statistics into the file as JSON.
+	"""
+	with open(file, 'w') as f:
+		json.dump(stats, f, indent=2, sort_keys=True)
+
+	return file
@@ -4,15 +4,28 @@
 # to csv format for HTM price upload to Bloomberg AIM.
 # 
 
-from trustee_report.report import getHTMPositionsFromFiles
-from trustee_report.utility import getInputDirectory
+from trustee_report.report import probe
+from trustee_report.utility import getInputDirectory, getWorkers, isCacheEnabled \
+								, getCacheDirectory, getCacheMaxAge, getCacheMaxSize \
+								, getManifestFile, getWatchInterval, getWatchSettle \
+								, getErrorReportFile, isOutputByPortfolio, isHistoryEnabled \
+								, getHistoryFile, getDuplicatePolicy, getDuplicateReportFile
+from trustee_report.incremental import runIncremental
+from trustee_report.watch import scanDirectory, readyFiles, isInputFile
+from trustee_report.mapping import reloadIfChanged
+from trustee_report.cache import pruneCache
+from trustee_report.history import appendPositions
+from trustee_report.duplicate import getUniqueHTMPositionsFromFiles, isConflict \
+								, getUniqueHTMPositionsAndErrorsFromFiles
+from trustee_report import instrument
 from toolz.functoolz import compose
 from utils.utility import writeCsv
 from utils.file import getFiles
 from functools import partial
-from itertools import chain
+from itertools import chain, groupby
 from os.path import join
-import logging
+from datetime import datetime
+import logging, time, csv, os
 logger = logging.getLogger(__name__)
 
 
@@ -31,12 +44,25 @@ def lognRaise(msg):
 
 
 
-"""
-	[List] positions => [String] output csv file name
+# write buffer of each output file
+outputBufferSize = 1024*1024
 
-	Side effect: write a csv file in the local directory
-"""
-def outputCsv(positions):
+
+
+def outputCsv(positions, tag=None, byPortfolio=None):
+	"""
+	[Iterable] positions, [String] tag (optional, added to the file names)
+	[Bool] byPortfolio (one file per portfolio too, None means the
+		[output] by_portfolio setting)
+		=> [List] output csv file names, one per valuation date (and
+			portfolio), sorted
+
+	Side effect: write the csv files in the local directory
+
+	Positions are written as they come, in one pass, so they need not be
+	held in memory. Each file is written under a temporary name and renamed
+	at the end, so an error half way leaves no partial output.
+	"""
 	headerRows = \
 		[ ['Upload Method', 'INCREMENTAL', '', '', '', '']
 		, [ 'Field Id', 'Security Id Type', 'Security Id', 'Account Code'
@@ -46,9 +72,53 @@ def outputCsv(positions):
 	toCsvRow = lambda p: \
 		['CD012', 4, p['ISIN'], p['Portfolio'], p['AmortizedCost'], p['AmortizedCost']]
 
-	return writeCsv( 'f3321tscf.htm.' + positions[0]['Date'] + '.inc'
-				   , chain(headerRows, map(toCsvRow, positions))
-				   )
+	byPortfolio = isOutputByPortfolio() if byPortfolio == None else byPortfolio
+	toFileName = lambda p: \
+		'f3321tscf.htm.' + p['Date'] + ('.' + p['Portfolio'] if byPortfolio else '') \
+		+ ('' if tag == None else '.' + tag) + '.inc'
+
+	outputs = {}	# file name => (open temporary file, csv writer)
+
+	def writeRows():
+		for p in positions:
+			fileName = toFileName(p)
+			if not fileName in outputs:
+				f = open(fileName + '.tmp', 'w', newline='', buffering=outputBufferSize)
+				outputs[fileName] = (f, csv.writer(f))
+				outputs[fileName][1].writerows(headerRows)
+
+			outputs[fileName][1].writerow(toCsvRow(p))
+
+	try:
+		instrument.timeCall('writeCsv', writeRows)
+	except:
+		for (f, _) in outputs.values():
+			f.close()
+			os.remove(f.name)
+		raise
+
+	for fileName in outputs:
+		outputs[fileName][0].close()
+		os.replace(fileName + '.tmp', fileName)
+
+	return sorted(outputs)
+
+
+
+def recordHistory(positions):
+	"""
+	[Iterable] positions => [Iterable] the same positions
+
+	Side effect: append the positions into the history database as they
+	pass, if it is enabled in the config file.
+	"""
+	return appendPositions(getHistoryFile(), positions) if isHistoryEnabled() else positions
+
+
+
+def showOutput(files):
+	print('\nOutput File: {0}'.format(', '.join(files) if files != [] else None))
+	return files
 
 
 
@@ -57,28 +127,241 @@ getInputFiles = lambda inputDirectory: \
 compose(
 	list
   , partial(map, lambda fn: join(inputDirectory, fn))
-  , partial(filter, lambda fn: fn.endswith('.xls') or fn.endswith('.xlsx'))
+  , partial(filter, isInputFile)
   , getFiles
 )(inputDirectory)
 
 
 
-"""
-	[String] input directory => [String] output csv file name
+def reportDuplicates(duplicates, duplicateReportFile=None):
+	"""
+	[List] duplicates (see duplicate.py), [String] duplicate report file
+		(None means the one in the config file)
+		=> [List] duplicates
+
+	Side effect: if there are duplicates, write them into the report file,
+	with a price conflict column, and print a summary.
+	"""
+	if duplicates == []:
+		return duplicates
+
+	duplicateReportFile = getDuplicateReportFile() if duplicateReportFile == None \
+							else duplicateReportFile
+	writeCsv( duplicateReportFile
+			, chain( [[ 'Portfolio', 'Date', 'ISIN', 'Kept File', 'Kept Price'
+					  , 'Dropped File', 'Dropped Price', 'Conflict']]
+				   , map( lambda d: list(d[:4]) + ['' if d[4] == None else d[4]] \
+				   					+ list(d[5:]) + [isConflict(d)]
+						, duplicates)))
+	print('{0} duplicate position(s) dropped, {1} with a different price, see {2}'.format(
+			len(duplicates), len(list(filter(isConflict, duplicates))), duplicateReportFile))
+	return duplicates
+
+
+
+def doOutput(inputDirectory, workers=0, keep='none', duplicateReportFile=None):
+	"""
+	[String] input directory, [Int] workers (worker processes to parse files,
+		0 means no parallel parsing)
+	[String] keep (which file to keep when files have the same portfolio
+		and date, see duplicate.py, 'none' means keep all)
+	[String] duplicate report file (None means the one in the config file)
+		=> [List] output csv file names
+
+	Side effect: write csv files into the output directory. If files are
+	dropped as duplicates, write their positions into the duplicate report
+	file.
+	"""
+	(positions, duplicates) = \
+	compose(
+		lambda files: getUniqueHTMPositionsFromFiles(files, keep, workers)
+	  , showList
+	  , lambda files: \
+	  		lognRaise('no input files found under \'{0}\''.format(inputDirectory)) \
+	  		if files == [] else files
+	  , getInputFiles
+	)(inputDirectory)
+
+	output = outputCsv(recordHistory(positions))
+	reportDuplicates(duplicates, duplicateReportFile)
+	return output
+
+
+
+def doBatchOutput( inputDirectory, errorReportFile, workers=0, keep='none'
+				 , duplicateReportFile=None):
+	"""
+	[String] input directory, [String] error report file, [Int] workers
+	[String] keep, [String] duplicate report file (same as doOutput())
+		=> ( [List] output csv file names, empty if no file is good
+		   , [List] ParseError of the files that fail
+		   )
+
+	Same as doOutput(), but files that fail do not stop the others.
+
+	Side effect: write csv files of the HTM positions from the good files,
+	an error report (file, line, reason) if any file fails, and the
+	duplicate report if files are dropped as duplicates.
+	"""
+	files = getInputFiles(inputDirectory)
+	if files == []:
+		lognRaise('no input files found under \'{0}\''.format(inputDirectory))
+
+	(positions, duplicates, errors) = \
+		getUniqueHTMPositionsAndErrorsFromFiles(showList(files), keep, workers)
+	if errors != []:
+		writeCsv( errorReportFile
+				, chain( [['File', 'Line', 'Reason']]
+					   , map(lambda e: [e.file, e.line, e.reason], errors)))
+
+	output = outputCsv(recordHistory(positions))
+	reportDuplicates(duplicates, duplicateReportFile)
+	return (output, errors)
+
+
 
-	Side effect: write a csv file into the output directory
 """
-doOutput = lambda inputDirectory: \
-compose(
-	outputCsv
-  , list
-  , getHTMPositionsFromFiles
-  , showList
-  , lambda files: \
-  		lognRaise('no input files found under \'{0}\''.format(inputDirectory)) \
-  		if files == [] else files
-  , getInputFiles
-)(inputDirectory)
+	[] => [String] current time, to tag output files that hold only part of
+		the prices of a date, so that they do not overwrite the full output
+		of that date or each other
+"""
+timeTag = lambda: datetime.now().strftime('%Y%m%d%H%M%S')
+
+
+
+def doIncrementalOutput( inputDirectory, manifestFile, workers=0, keep='none'
+					   , duplicateReportFile=None):
+	"""
+	[String] input directory, [String] manifest file, [Int] workers
+	[String] keep, [String] duplicate report file (same as doOutput())
+		=> [List] output csv file names, empty if no price is new or changed
+
+	Side effect: write csv files with only the new or changed HTM prices of
+	new or changed input files, update the manifest file. The file names
+	are tagged with the time (see timeTag()). If files are dropped as
+	duplicates, write their positions into the duplicate report file.
+	"""
+	duplicates = []
+	output = compose(
+		lambda positions: outputCsv(positions, timeTag())
+	  , recordHistory
+	  , lambda files: runIncremental(files, manifestFile, workers, keep, duplicates)
+	  , getInputFiles
+	)(inputDirectory)
+
+	reportDuplicates(duplicates, duplicateReportFile)
+	return output
+
+
+
+def doValidate(inputDirectory):
+	"""
+	[String] input directory => [Bool] all files are good
+
+	Read only the header of each input file, much faster than parsing them.
+
+	Side effect: print portfolio and date of each file, files that fail
+	(fund name or date missing or unknown), and files with the same
+	portfolio and date (resubmissions).
+	"""
+	probed, failed = [], []
+	for file in getInputFiles(inputDirectory):
+		try:
+			probed.append(probe(file))
+		except Exception as e:
+			failed.append((file, str(e)))
+
+	for (portfolio, date, file) in probed:
+		print('{0} {1} {2}'.format(portfolio, date, file))
+
+	for (file, reason) in failed:
+		print('FAILED {0}: {1}'.format(file, reason))
+
+	byPortfolioDate = lambda t: (t[0], t[1])
+	duplicates = list(filter( lambda g: len(g) > 1
+							, map( lambda x: list(x[1])
+								 , groupby(sorted(probed), byPortfolioDate))))
+	for group in duplicates:
+		print('DUPLICATE {0} {1}: {2}'.format(
+				group[0][0], group[0][1], ', '.join(map(lambda t: t[2], group))))
+
+	return failed == [] and duplicates == []
+
+
+
+def endOfRun(statsFile=None):
+	"""
+	[String] statistics file (None means no statistics)
+
+	Side effect: save the statistics as JSON if a file is given, prune the
+	parse cache if it is enabled.
+	"""
+	if statsFile != None:
+		print('Statistics: {0}'.format(instrument.dumpJson(statsFile)))
+
+	if isCacheEnabled():
+		pruneCache(getCacheDirectory(), getCacheMaxAge(), getCacheMaxSize())
+
+
+
+def doWatch( inputDirectory, manifestFile, interval, settle, workers=0, statsFile=None
+		   , keep='none', duplicateReportFile=None):
+	"""
+	[String] input directory, [String] manifest file, [Float] interval
+	[Float] settle, [Int] workers, [String] statistics file
+	[String] keep, [String] duplicate report file (same as doOutput())
+		=> never returns, stop it with Ctrl-C
+
+	Poll the input directory every interval seconds. Once new or changed
+	files have not changed for settle seconds, parse them in one batch the
+	same way as an incremental run and write the new or changed HTM prices
+	right away. The file name is tagged with the time, so that outputs of
+	the same date do not overwrite each other.
+
+	If the batch fails, its files are parsed again one by one, so a file
+	that fails is logged and skipped until it changes again, it does not
+	stop the other files or the watch. Changes to the mapping file are
+	picked up before each scan.
+
+	Side effect: after each batch, write the duplicate report if files of
+	the batch are dropped as duplicates, save the statistics (counted since
+	the watch started) and prune the cache, see endOfRun().
+	"""
+	def runOne(file):
+		try:
+			return runIncremental([file], manifestFile, 0, keep, duplicates)
+		except Exception:
+			logger.exception('doWatch(): failed to process {0}'.format(file))
+			return []
+
+	lastScan, handled = {}, {}
+	while True:
+		reloadIfChanged()
+		scan = scanDirectory(inputDirectory)
+		files = list(filter( lambda f: handled.get(f) != scan[f]
+						   , readyFiles(lastScan, scan, time.time(), settle)))
+
+		if files != []:
+			duplicates = []
+			try:
+				positions = runIncremental(files, manifestFile, workers, keep, duplicates)
+			except Exception:
+				logger.warning('doWatch(): batch failed, process {0} one by one'.format(files))
+				positions = list(chain.from_iterable(map(runOne, files)))
+
+			for file in files:
+				handled[file] = scan[file]
+
+			if positions != []:
+				output = outputCsv(recordHistory(positions), timeTag())
+				logger.info('doWatch(): {0} written for {1}'.format(output, files))
+				showOutput(output)
+
+			reportDuplicates(duplicates, duplicateReportFile)
+			endOfRun(statsFile)
+
+		lastScan = scan
+		time.sleep(interval)
 
 
 
@@ -94,5 +377,86 @@ if __name__ == '__main__':
 		$ python main.py
 
 	The output file will be written to the local directory.
+
+	In every mode below too, when two files are for the same portfolio and
+	date (a statement sent again), only one of them is kept, see the
+	[duplicate] section of the config file.
+
+	To parse the files in parallel with 4 worker processes, do:
+
+		$ python main.py --workers 4
+
+	The default number of workers comes from the config file.
+
+	To process only files that are new or changed since the last incremental
+	run, and output only the HTM prices that changed, do:
+
+		$ python main.py --incremental
+
+	The output file names are tagged with the time, e.g.,
+	f3321tscf.htm.2020-02-29.20200305143000.inc, so that they do not
+	overwrite the full output of the same date.
+
+	To keep running and output new or changed HTM prices as soon as new
+	statements land in the input directory, do:
+
+		$ python main.py --watch
+
+	To go on with the other files when some files fail, and write the
+	failed files into an error report, do:
+
+		$ python main.py --keep-going
+
+	To check the input files without parsing them, i.e., fund name and
+	valuation date of each file can be read, and no two files are for the
+	same portfolio and date, do:
+
+		$ python main.py --validate
+
+	To save timing and counters of each stage as JSON, do:
+
+		$ python main.py --stats stats.json
+
+	With --watch, the statistics are saved again after each batch of files.
 	"""
-	print('\nOutput File: {0}'.format(doOutput(getInputDirectory())))
\ No newline at end of file
+	import argparse, sys
+	parser = argparse.ArgumentParser(description='Create HTM price upload file')
+	parser.add_argument( '--workers', type=int, default=getWorkers()
+					   , help='number of worker processes, 0 means no parallel parsing')
+	parser.add_argument( '--incremental', action='store_true'
+					   , help='process only new or changed files, output only changed prices')
+	parser.add_argument( '--watch', action='store_true'
+					   , help='keep watching the input directory, like --incremental')
+	parser.add_argument( '--keep-going', action='store_true'
+					   , help='skip files that fail and write them into an error report')
+	parser.add_argument( '--validate', action='store_true'
+					   , help='only check fund name and date of the input files')
+	parser.add_argument( '--stats', metavar='FILE'
+					   , help='save per stage timing and counters to FILE as JSON')
+	args = parser.parse_args()
+
+	if args.stats:
+		instrument.enable()
+
+	if args.validate:
+		valid = doValidate(getInputDirectory())
+		endOfRun(args.stats)
+		sys.exit(0 if valid else 1)
+	elif args.watch:
+		doWatch( getInputDirectory(), getManifestFile(), getWatchInterval()
+			   , getWatchSettle(), args.workers, args.stats, getDuplicatePolicy()
+			   , getDuplicateReportFile())
+	elif args.incremental:
+		showOutput(doIncrementalOutput( getInputDirectory(), getManifestFile(), args.workers
+									  , getDuplicatePolicy(), getDuplicateReportFile()))
+	elif args.keep_going:
+		(output, errors) = doBatchOutput( getInputDirectory(), getErrorReportFile(), args.workers
+										, getDuplicatePolicy(), getDuplicateReportFile())
+		showOutput(output)
+		if errors != []:
+			print('{0} file(s) failed, see {1}'.format(len(errors), getErrorReportFile()))
+	else:
+		showOutput(doOutput( getInputDirectory(), args.workers, getDuplicatePolicy()
+						   , getDuplicateReportFile()))
+
+	endOfRun(args.stats)
\ No newline at end of file
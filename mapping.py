@@ -0,0 +1,105 @@
+# coding=utf-8
+#
+# Fund name to portfolio id, and bond identifier to ISIN lookups, loaded
+# from the mapping file (see getMappingFile()) once when this module is
+# first imported.
+#
+# The lookups are read only. reloadIfChanged() loads them again if the
+# file has changed, so a long running process (watch mode) picks up a new
+# fund or bond without restarting.
+#
+from trustee_report.utility import getMappingFile
+from types import MappingProxyType
+import configparser, hashlib, os
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+"""
+	[String] fund name => [String] fund name in lower case, with leading,
+		trailing and repeated spaces removed
+"""
+normalizeName = lambda name: ' '.join(name.split()).lower()
+
+
+
+def loadMappings(file):
+	"""
+	[String] file
+		=> ( [Mapping] normalized fund name => portfolio id
+		   , [Mapping] bond identifier => ISIN
+		   , [String] version, changes when the content of the file changes
+		   )
+	"""
+	with open(file, 'rb') as f:
+		content = f.read()
+
+	cfg = configparser.ConfigParser(interpolation=None, delimiters=('=',))
+	cfg.optionxform = str		# keep the case of bond identifiers
+	cfg.read_string(content.decode('utf-8'), file)
+
+	return ( MappingProxyType({normalizeName(k): v for (k, v) in cfg.items('fund')})
+		   , MappingProxyType(dict(cfg.items('isin')))
+		   , hashlib.sha256(content).hexdigest()[:12]
+		   )
+
+
+
+def fileTime(file):
+	"""
+	[String] file => [Float] modified time, None if it cannot be read
+	"""
+	try:
+		return os.stat(file).st_mtime
+	except OSError:
+		return None
+
+
+
+# initialized only once when this module is first imported by others
+if not 'mappings' in globals():
+	mappingFile = getMappingFile()
+	mappingTime = fileTime(mappingFile)
+	mappings = loadMappings(mappingFile)
+
+
+
+def getFundMap():
+	return mappings[0]
+
+
+
+def getIsinMap():
+	return mappings[1]
+
+
+
+def getMappingVersion():
+	return mappings[2]
+
+
+
+def reloadIfChanged():
+	"""
+	=> [Bool] whether the mappings are reloaded
+
+	Load the mapping file again if its modified time has changed. If the
+	new file cannot be loaded, the error is logged and the lookups already
+	loaded are kept.
+	"""
+	global mappings, mappingTime
+	t = fileTime(mappingFile)
+	if t == mappingTime:
+		return False
+
+	try:
+		mappings = loadMappings(mappingFile)
+	except Exception:
+		logger.exception('reloadIfChanged(): failed to load {0}'.format(mappingFile))
+		return False
+	finally:
+		mappingTime = t
+
+	logger.info('reloadIfChanged(): {0} reloaded'.format(mappingFile))
+	return True
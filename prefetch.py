@@ -0,0 +1,87 @@
+# coding=utf-8
+#
+# Read input files ahead on background threads, so that reading the next
+# files (from a slow network share, say) overlaps with parsing the current
+# one. The parser then takes the file content from memory.
+#
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import os
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+def readBytes(file):
+	"""
+	[String] file => [Bytes] content of the file
+	"""
+	with open(file, 'rb') as f:
+		return f.read()
+
+
+
+def fileSize(file):
+	"""
+	[String] file => [Int] size in bytes, None if it cannot be read
+	"""
+	try:
+		return os.path.getsize(file)
+	except OSError:
+		return None
+
+
+
+def readAhead(files, depth, budget):
+	"""
+	[Iterable] files, [Int] depth (number of files to read ahead)
+	[Int] budget (bytes, maximum total size of the files read ahead)
+		=> [Iterable] (file, [Bytes] content, or None if the file is not read
+			ahead), in the same order as files
+
+	Up to depth files after the current one are read on background threads.
+	The budget counts the files read ahead and the one handed to the
+	caller, whose content is taken as in use until the caller asks for the
+	next file. A file that does not fit in what is left of the budget is
+	not read ahead, the caller reads it as usual. So does a file that fails to read,
+	the error then comes up when the caller reads it. depth < 1 means no
+	read ahead.
+	"""
+	if depth < 1:
+		yield from map(lambda file: (file, None), files)
+		return
+
+	files = iter(files)
+	pending = deque()	# (file, future or None, size)
+	inFlight = [0]		# total size of files read ahead and in use
+
+	def fill(executor):
+		while len(pending) < depth:
+			file = next(files, None)
+			if file == None:
+				return
+
+			size = fileSize(file)
+			if size != None and inFlight[0] + size <= budget:
+				pending.append((file, executor.submit(readBytes, file), size))
+				inFlight[0] = inFlight[0] + size
+			else:
+				pending.append((file, None, 0))
+
+	with ThreadPoolExecutor(max_workers=depth) as executor:
+		fill(executor)
+		while len(pending) > 0:
+			(file, future, size) = pending.popleft()
+			try:
+				content = None if future == None else future.result()
+			except Exception as e:
+				logger.warning('readAhead(): failed to read {0}: {1}'.format(file, repr(e)))
+				content = None
+
+			fill(executor)
+			yield (file, content)
+
+			# the caller has moved on from this file
+			content = None
+			inFlight[0] = inFlight[0] - size
+			fill(executor)
@@ -2,27 +2,72 @@
 #
 # Read China Life Trustee monthly reports (Excel format) to list of hodlings.
 # 
-from itertools import chain, filterfalse
-from functools import partial, reduce
+from itertools import chain, filterfalse, islice, starmap
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from collections.abc import Mapping
+from operator import countOf
 from toolz.functoolz import compose
-from utils.iter import divideToGroup, firstOf
+from utils.iter import firstOf
 from utils.excel import worksheetToLines
+from trustee_report.cache import readThroughCache
+from trustee_report import instrument
+from trustee_report.mapping import getFundMap, getIsinMap, getMappingVersion, \
+									normalizeName
+from trustee_report.prefetch import readAhead
+from trustee_report.utility import isCacheEnabled, getCacheDirectory, isRowTraceEnabled, \
+									getPrefetchDepth, getPrefetchMemory
 from xlrd import open_workbook
-from datetime import datetime
+from datetime import datetime, date
+from io import BytesIO
 import re
 import logging
 logger = logging.getLogger(__name__)
 
 
 
-def lognContinue(msg, x):
-	logger.debug(msg)
+def lognContinue(msg, x, *args):
+	"""
+	[String] msg, [Object] x, [Tuple] args => [Object] x
+
+	Side effect: log msg at debug level. The args are formatted into msg
+	('{0}' style) only when debug logging is on, so a call costs almost
+	nothing otherwise.
+	"""
+	if logger.isEnabledFor(logging.DEBUG):
+		logger.debug(msg.format(*args))
+
 	return x
 
 
 def lognRaise(msg):
 	logger.error(msg)
-	raise ValueError
+	raise ValueError(msg)
+
+
+
+class ParseError(ValueError):
+	"""
+	A file that cannot be read: the file, the line (row number of the sheet,
+	starting from 1) being read when the error occurred, and the reason.
+	"""
+	def __init__(self, file, line, reason):
+		super(ParseError, self).__init__('{0}, line {1}: {2}'.format(file, line, reason))
+		self.file = file
+		self.line = line
+		self.reason = reason
+
+	def __reduce__(self):	# so that it can be sent back from a worker process
+		return (ParseError, (self.file, self.line, self.reason))
+
+
+
+def toParseError(file, line, e):
+	"""
+	[String] file, [Int] line, [Exception] e => [ParseError] e with file and line
+	"""
+	return e if isinstance(e, ParseError) else \
+		ParseError(file, line, str(e) if isinstance(e, ValueError) else repr(e))
 
 
 
@@ -31,289 +76,800 @@ mergeDictionary = lambda d1, d2: \
 
 
 
-def getHTMPositionsFromFiles(files):
+class Position(Mapping):
+	"""
+	A position read from a trustee statement.
+
+	The column values of the row are kept in one dictionary (fields), the
+	fields added later on (portfolio, date, asset type and ISIN) are slots
+	set in place by tag(), so a position is not copied at every step.
+
+	It is a read only Mapping, so p['Quantity'], dict(p) and comparing with
+	a dictionary work the same as before. The keys are in the same order as
+	the dictionary position used to have: portfolio, date, asset type, the
+	column values, then ISIN.
+	"""
+	__slots__ = ('fields', 'Portfolio', 'Date', 'AssetType', 'ISIN')
+	headFields = ('Portfolio', 'Date', 'AssetType')
+	tailFields = ('ISIN',)
+	tagFields = frozenset(headFields + tailFields)
+
+	def __init__(self, fields, **tags):
+		self.fields = fields
+		self.tag(**tags)
+
+	def tag(self, **tags):
+		"""
+		Set the portfolio, date, asset type or ISIN, returns the position.
+		"""
+		for key in tags:
+			setattr(self, key, tags[key])
+		return self
+
+	def __getitem__(self, key):
+		if key in Position.tagFields:
+			try:
+				return getattr(self, key)
+			except AttributeError:
+				raise KeyError(key) from None
+
+		return self.fields[key]
+
+	def __iter__(self):
+		yield from filter(partial(hasattr, self), Position.headFields)
+		yield from self.fields
+		yield from filter(partial(hasattr, self), Position.tailFields)
+
+	def __len__(self):
+		return len(self.fields) + \
+			sum(map(partial(hasattr, self), Position.headFields + Position.tailFields))
+
+	def __repr__(self):
+		return 'Position({0})'.format(dict(self))
+
+
+
+# Bump this whenever a change to the parser changes the positions it
+# produces, so that entries in the parse cache become stale.
+parserVersion = '3'
+
+
+
+def getHTMPositionsFromFiles(files, workers=0):
 	"""
 	[Iterable] files (CL trustee excel files)
+	[Int] workers (number of worker processes, 0 means read the files one by
+		one in the current process)
 		=> [Iterable] HTM positions from these files, with ISIN code added to each
 			position.
+
+	When workers > 0, files are parsed in a process pool. The positions still
+	come out in the same order as the files. A file that fails does not stop
+	the other workers, its error (with the file name) is raised when the
+	iteration reaches that file.
 	"""
+	return chain.from_iterable(starmap(htmPositionsFromFile, prefetched(files))) if workers < 1 else \
+		chain.from_iterable(parallelMap(htmPositionListFromFile, files, workers))
 
-	def addISINCode(position):
 
-		# some bond identifiers are not ISIN, map them to ISIN
-		bondIsinMap = {
-			'DBANFB12014':'HK0000175916',	# Dragon Days Ltd 6% 03/21/22
-			'HSBCFN13014':'HK0000163607'	# New World Development 6% Sept 2023
-		}
-		
-		getIdentifier = lambda p: p['Description'].split()[0]
-		idToISIN = lambda id: bondIsinMap[id] if id in bondIsinMap else id
 
-		return \
-		compose(
-			lambda isin: mergeDictionary(
-			 	position
-			  , {'ISIN': isin}
-			)
-		  , idToISIN
-		  , getIdentifier
-		)(position)
-	# End of addISINCode()
+def getHTMPositionListsFromFiles(files, workers=0):
+	"""
+	[Iterable] files (CL trustee excel files)
+	[Int] workers (same as getHTMPositionsFromFiles())
+		=> [Iterable] (file, (portfolio id, date), [List] HTM positions of
+			that file), see keyedPositionListFromFile()
+	"""
+	files = list(files)
+	return map( lambda t: (t[0],) + t[1]
+			  , zip( files
+			  	   , starmap(keyedPositionListFromFile, prefetched(files)) if workers < 1 else \
+			  	   	 parallelMap(keyedPositionListFromFile, files, workers)))
 
 
-	htmPositionsFromFile = compose(
-		partial(map, addISINCode)
-	  , partial(filter, lambda p: p['AssetType'] == 'HTMBond')
-	  , readFile
-	)
 
+def getHTMPositionListsAndErrorsFromFiles(files, workers=0):
+	"""
+	[Iterable] files (CL trustee excel files)
+	[Int] workers (same as getHTMPositionsFromFiles())
+		=> ( [List] (file, (portfolio id, date), [List] HTM positions of that
+		   	 file), of the files that are read successfully
+		   , [List] ParseError of each file that fails
+		   )
+
+	Unlike getHTMPositionListsFromFiles(), a bad file does not stop the
+	others.
+	"""
+	files = list(files)
+	results = list(starmap(htmPositionListOrError, prefetched(files)) if workers < 1 else \
+				parallelMap(htmPositionListOrError, files, workers))
 
-	return reduce(chain, map(htmPositionsFromFile, files))
+	return ( list(map( lambda t: (t[0],) + t[1][0]
+					 , filter(lambda t: t[1][1] == None, zip(files, results))))
+		   , list(filter(lambda e: e != None, map(lambda r: r[1], results)))
+		   )
 
 
 
-def readFile(file):
+def getHTMPositionsAndErrorsFromFiles(files, workers=0):
 	"""
-	[String] file 
-		=> [Iterable] Positions, each position is a dictionary containing
-			the position's identifier, portfolio id and HTM price.
+	[Iterable] files (CL trustee excel files)
+	[Int] workers (same as getHTMPositionsFromFiles())
+		=> ( [List] HTM positions of the files that are read successfully
+		   , [List] ParseError of each file that fails
+		   )
+
+	Unlike getHTMPositionsFromFiles(), a bad file does not stop the others.
 	"""
+	(filePositions, errors) = getHTMPositionListsAndErrorsFromFiles(files, workers)
+	return (list(chain.from_iterable(map(lambda t: t[2], filePositions))), errors)
 
 
-	# [Iterable] lines => [List] sections
-	# a line is List of values, a section is a List of lines
-	getSections = partial(
-		divideToGroup
-	  , lambda line: re.match('[IVX]+\.\s+', line[0]) != None	# is it a section header line
-	)
 
+def htmPositionListOrError(file, content=None):
+	"""
+	[String] file, [Bytes] content (optional, same as readFile())
+		=> ([Tuple] result of keyedPositionListFromFile(), None), or
+			(None, [ParseError] error) if the file fails
+	"""
+	try:
+		return (keyedPositionListFromFile(file, content), None)
+	except Exception as e:
+		return (None, toParseError(file, 0, e))
 
-	getPositionsFromLines = compose(
-		partial(reduce, chain)
-	  , partial(map, getPositionsFromSection)
-	  , getSections
-	)
 
 
-	emptyLine = lambda line: len(line) == 0 or all(map(lambda c: c == '', line))
+htmAssetTypes = ('HTMBond',)
 
 
-	return \
-	compose(
-		lambda t: map( partial(mergeDictionary, {'Portfolio': t[0], 'Date': t[1]})
-					 , t[2]
-					 )
-	  , lambda lines: ( getPortfolioIdFromLines(lines)
-	  				  , getDateFromLines(lines)
-					  , getPositionsFromLines(lines)
-					  )
-  	  , partial(filterfalse, emptyLine)
-	  , fileToLines
-	  , lambda file: lognContinue('readFile(): {0}'.format(file), file)
+
+def htmPositionsFromFile(file, content=None):
+	"""
+	[String] file, [Bytes] content (optional, same as readFile())
+		=> [Iterable] HTM positions from the file, with ISIN code added to
+			each position.
+	"""
+	return compose(
+		partial(map, addISINCode)
+	  , partial(loadFile, assetTypes=htmAssetTypes, content=content)
 	)(file)
 
 
 
-def getPortfolioIdFromLines(lines):
+def htmPositionListFromFile(file, content=None):
 	"""
-	[Iterable] lines => [String] portfolio id
+	[String] file, [Bytes] content (optional, same as readFile())
+		=> [List] HTM positions from the file
 
-	Search for the line that contains the fund name and convert the
-	name to portfolio id.
+	Runs in a worker process, so the positions are materialized before being
+	sent back. An error comes back as the ParseError (file, line, reason)
+	raised by readFile().
 	"""
+	return list(htmPositionsFromFile(file, content))
 
-	# [Iterable] lines => [Dictionary] line (or None if not found)
-	findFundNameLine = partial(
-		firstOf
-	  , lambda line: \
-	  		isinstance(line[0], str) and line[0].lower().startswith('fund name:')
-	)
 
 
-	# [Iterable] lines => [String] fund name (raise error if not found)
-	getFundNameFromLines = compose(
-		lambda line: line[0][10:].strip()
-	  , lambda line: lognRaise('getFundNameFromLines(): failed get fund name line') \
-	  					if line == None else line
-	  , findFundNameLine
-	)
+def keyedPositionListFromFile(file, content=None):
+	"""
+	[String] file, [Bytes] content (optional, same as readFile())
+		=> ( (portfolio id, date) from the header of the file
+		   , [List] HTM positions from the file
+		   )
+
+	The positions are tagged with the portfolio and date of the header, so
+	they are taken from the first position. A file without HTM positions
+	has its header read again (see probe()), so it still has them.
+	"""
+	positions = htmPositionListFromFile(file, content)
+	return ( (positions[0]['Portfolio'], positions[0]['Date']) if positions != [] \
+			 else probe(file, content)[:2]
+		   , positions)
+
+
+
+"""
+	[Iterable] files => [Iterable] (file, [Bytes] content or None), files
+		read ahead on threads as set in the config file
+"""
+prefetched = lambda files: \
+	readAhead(files, getPrefetchDepth(), getPrefetchMemory())
+
+
+
+def parallelMap(func, files, workers):
+	"""
+	[Function] func, [Iterable] files, [Int] workers
+		=> [Iterable] func(file) for each file, in the same order as files
+	"""
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		yield from executor.map(func, files)
+
 
 
-	nameMap = \
-	{ 'CLT-CLI HK BR (Class A-HK) Trust Fund  (Bond) - Par': '12229'
-	, 'CLT-CLI HK BR (Class A-HK) Trust Fund  (Bond)': '12734'
-	, 'CLT-CLI Macau BR (Class A-MC)Trust Fund (Bond)': '12366'
-	, 'CLT-CLI Macau BR (Class A-MC)Trust Fund (Bond) - Par': '12549'
-	, 'CLT-CLI HK BR (Class A-HK) Trust Fund - Par': '11490'
-	, 'CLI Macau BR (Fund)': '12298'
-	, 'CLI HK BR (Class G-HK) Trust Fund (Sub-Fund-Bond)': '12630'
-	, 'CLI HK BR (Class G-HK) Trust Fund': '12341'
-	}
+def addISINCode(position):
+	"""
+	[Position] position => [Position] position with 'ISIN' field added
+	"""
+
+	# some bond identifiers are not ISIN, map them to ISIN
+	isinMap = getIsinMap()
 
 	return \
 	compose(
-		lambda name: nameMap[name]
-	  , lambda name: lognRaise('getPortfolioIdFromLines(): unsupported fund name {0}'.\
-	  							format(name)) if not name in nameMap else name
-	  , getFundNameFromLines
-	)(lines)
+		lambda isin: position.tag(ISIN=isin)
+	  , lambda id: isinMap.get(id, id)
+	  , lambda p: p['Description'].split()[0]
+	)(position)
 
 
 
-def getDateFromLines(lines):
+def loadFile(file, assetTypes=None, content=None):
 	"""
-	[Iterable] lines => [String] date (yyyy-mm-dd)
+	[String] file, [Iterable] assetTypes, [Bytes] content (optional, same as
+		readFile())
+		=> [Iterable] positions
+
+	Same as readFile(), but goes through the on disk parse cache when it is
+	enabled in the config file. The portfolio id of cached positions comes
+	from the fund name lookup, so a change to the lookup is a new version.
+	So is a different set of asset types.
+	"""
+	version = parserVersion + '.' + getMappingVersion() + \
+				('' if assetTypes == None else '.' + '-'.join(sorted(assetTypes)))
+
+	return readThroughCache( getCacheDirectory(), version
+						   , partial(readFile, assetTypes=assetTypes, content=content)
+						   , file, content) \
+			if isCacheEnabled() else readFile(file, assetTypes, content)
+
+
 
-	Search for the line that contains the date and return it as a string.
+def readFile(file, assetTypes=None, content=None):
 	"""
+	[String] file 
+	[Iterable] assetTypes (optional), e.g., ('HTMBond',), read only sections
+		of these asset types, other sections are skipped without building
+		their positions. None means all sections.
+	[Bytes] content (optional), content of the file already read into
+		memory, then the file is not read again.
+		=> [Iterable] Positions, each position is a Position (a read only
+			dictionary) containing the position's identifier, portfolio id
+			and HTM price.
+
+	Any error, when reading the header or later when the positions are
+	iterated, is raised as a ParseError with the row being read.
+	"""
+	row = [0]	# sheet row being read, for error messages
+
+	def numbered(lines):
+		for line in lines:
+			row[0] = row[0] + 1
+			yield line
+
+	def raiseWithRow(positions):
+		try:
+			yield from positions
+		except Exception as e:
+			raise toParseError(file, row[0], e) from e
 
-	# [Iterable] lines => [Dictionary] line (or None if not found)
-	findDateLine = partial(
-		firstOf
-	  , lambda line: \
-	  		isinstance(line[0], str) and line[0].lower().startswith('valuation period:')
+
+	getPositionsFromLines = compose(
+		chain.from_iterable
+	  , partial( map
+	  		   , lambda section: instrument.timed( 'getPositionsFromSection'
+	  		   									 , getPositionsFromSection(section)))
+	  , lambda sections: instrument.counted(sections, 'files', file, 'sections')
+	  , lambda lines: instrument.timed('getSections', getSections(lines, assetTypes))
 	)
 
 
+	try:
+		return \
+		compose(
+			raiseWithRow
+		  , lambda positions: instrument.timed('readFile', positions, file)
+		  , lambda t: instrument.countPositions(
+		  				file, t[0], map(lambda p: p.tag(Portfolio=t[0], Date=t[1]), t[2]))
+		  , lambda t: ( getPortfolioIdFromHeader(t[0])
+		  			  , getDateFromHeader(t[0])
+					  , getPositionsFromLines(t[1])
+					  )
+		  , readHeader
+		  , lambda lines: instrument.counted(lines, 'files', file, 'rows')
+		  , numbered
+		  , lambda file: fileToLines(file, content)
+		  , lambda file: lognContinue('readFile(): {0}', file, file)
+		)(file)
+	except Exception as e:
+		raise toParseError(file, row[0], e) from e
+
+
+
+# first cell of a section header line, like 'I. Cash - HKD'
+sectionHeaderPattern = re.compile(r'[IVX]+\.\s+')
+
+
+
+"""
+	[List] line => [Bool] is it a section header line
+"""
+isSectionHeader = lambda line: \
+	isinstance(line[0], str) and sectionHeaderPattern.match(line[0]) != None
+
+
+
+emptyLine = lambda line: line.count('') == len(line)
+
+
+
+# row types given by classifyRows(), the table header lines of a section
+# are data rows too, getPositionsFromSection() reads them by position.
+EmptyRow, SectionHeaderRow, DataRow = 'empty', 'section header', 'data'
+
+
+
+def classifyRows(lines):
 	"""
-	[String] date header => [String] date (yyyy-mm-dd)
-	The date header looks like: 
-		'Valuation Period: From 01/02/2020 to 29/02/2020'
+	[Iterable] lines => [Iterable] (row type, line)
+
+	Tag each line in one pass: an empty line, a section header line, or
+	any other line.
 	"""
-	getDateFromString = compose(
-	  	lambda s: datetime.strftime(datetime.strptime(s, '%d/%m/%Y'), '%Y-%m-%d')
-	  , lambda s: s.split()[-1]
-	)
+	for line in lines:
+		yield ( EmptyRow if emptyLine(line) else \
+				SectionHeaderRow if isSectionHeader(line) else DataRow
+			  , line)
+
+
+
+def getSections(lines, assetTypes=None):
+	"""
+	[Iterable] lines, [Iterable] assetTypes (optional, wanted asset types)
+		=> [Iterable] sections
+	a line is List of values, a section is an iterator over its lines
+
+	A section starts from its section header line. Empty lines, and lines
+	before the first section header, are left out. So are the lines of a
+	section whose asset type is not wanted.
+
+	Sections are read from the lines as they are consumed, like groupby(),
+	so no section is held in memory. Moving on to the next section skips
+	what is left of the current one.
+	"""
+	rows = classifyRows(lines)
+	nextHeader = [firstOf(lambda r: r[0] == SectionHeaderRow, rows)]
+
+	def sectionLines(header):
+		yield header
+		for (rowType, line) in rows:
+			if rowType == SectionHeaderRow:
+				nextHeader[0] = (rowType, line)
+				return
+			elif rowType != EmptyRow:
+				yield line
+
+		nextHeader[0] = None
+
+	while nextHeader[0] != None:
+		header = nextHeader[0][1]
+		section = sectionLines(header)
+		if assetTypes == None or getAssetType(header[0]) in assetTypes:
+			yield section
+
+		for _ in section:	# skip what is left of the section
+			pass
+
 
 
+def readHeader(lines):
+	"""
+	[Iterable] lines
+		=> ( [Dictionary] header, key (lower case) => value
+		   , [Iterable] the rest of the lines, starting from the first section
+		   	 header line
+		   )
+
+	Read the lines before the first section header once. Lines like
+	'Fund Name: xxx' or 'Valuation Period: From 01/02/2020 to 29/02/2020'
+	go into the header, in whatever order they appear, e.g.,
+
+		{'fund name': 'xxx', 'valuation period': 'From 01/02/2020 to 29/02/2020'}
+
+	Other lines (titles) and empty lines are skipped. The lines after are
+	not read.
+	"""
+	it = iter(lines)
+	header = {}
+	for line in it:
+		if emptyLine(line):
+			continue
+
+		if isSectionHeader(line):
+			return header, chain([line], it)
+
+		if isinstance(line[0], str) and ':' in line[0]:
+			(key, value) = line[0].split(':', 1)
+			header.setdefault(key.strip().lower(), value.strip())
+
+	return header, iter([])
+
+
+
+# the header block is within the first few lines of a statement
+probeRows = 30
+
+
+
+def probe(file, content=None):
+	"""
+	[String] file, [Bytes] content (optional, same as readFile())
+		=> [Tuple] (portfolio id, date, file)
+
+	Read only the header block of the first sheet, not the sections, to find
+	out which portfolio and date a file is for. Raises ValueError like
+	readFile() if the fund name or date is missing or unknown.
+	"""
+	lines = fileToLines(file, content)
+	try:
+		header, _ = readHeader(islice(lines, probeRows))
+		return (getPortfolioIdFromHeader(header), getDateFromHeader(header), file)
+	finally:
+		lines.close()
+
+
+
+def getPortfolioIdFromHeader(header):
+	"""
+	[Dictionary] header (from readHeader()) => [String] portfolio id
+	"""
 	return \
 	compose(
-		getDateFromString
-	  , lambda line: lognRaise('getDateFromLines(): failed get date line') \
-	  					if line == None else line[0]
-	  , findDateLine
-	)(lines)
+		fundNameToPortfolioId
+	  , lambda header: lognRaise('getPortfolioIdFromHeader(): failed get fund name line') \
+	  					if not 'fund name' in header else header['fund name']
+	)(header)
 
 
 
-def getPositionsFromSection(lines):
+def getDateFromHeader(header):
 	"""
-	[List] lines that belong to one section
-		=> [Iterable] positions from that section
+	[Dictionary] header (from readHeader()) => [String] date (yyyy-mm-dd)
 	"""
+	return \
+	compose(
+		valuationPeriodToDate
+	  , lambda header: lognRaise('getDateFromHeader(): failed get date line') \
+	  					if not 'valuation period' in header else header['valuation period']
+	)(header)
 
-	# [String] section header (first cell in the first row of the section)
-	# 	=> [String] asset type
-	getAssetType = compose(
-		lambda sectionHeader: \
-			'Cash' if 'cash' in sectionHeader else \
-			'Equity' if 'equities' in sectionHeader else \
-			'Accruals' if 'accruals' in sectionHeader else \
-			'HTMBond' if 'debt securities' in sectionHeader \
-			and 'held for maturity' in sectionHeader else \
-			'AFSBond' if 'debt securities' in sectionHeader \
-			and 'available for sales' in sectionHeader else \
-			'TradingBond' if 'debt securities' in sectionHeader \
-			and 'held for trading' in sectionHeader else \
-			lognRaise('getAssetType(): unsupported asset type: {0}'.format(sectionHeader))
-	  
-	  , lambda sectionHeader: sectionHeader.lower()
-	)
 
 
+def fundNameToPortfolioId(name):
 	"""
-		[Tuple] h (String, String) => [String] new header
+	[String] fund name => [String] portfolio id
 
-		The original header is a String tuple, to make it easier for viewing
-		and testing, we convert some of them to a single word. Actually for
-		the purpose of HTM price uploading, we only need to convert the column
-		for HTM amortized cost ('AmortizedPrice') column.
+	Names are looked up ignoring case and extra spaces.
 	"""
-	toNewHeader = lambda h: \
-		'Description' if h[2].startswith('Description') else \
-		'Currency' if (h[0], h[2]) == ('', 'CCY') else \
-		'Cost' if (h[0], h[2]) == ('', 'Cost') else \
-		'MarketValue' if h in [('Total', 'Mkt', 'Value'), ('Total', 'M.', 'Value')] else \
-		'MarketPrice' if (h[1], h[2]) == ('Market', 'Price') else \
-		'AmortizedCost' if (h[1], h[2]) == ('Amortized', 'Price') else \
-		'Quantity' if (h[0], h[2]) == ('', 'Share') or (h[1], h[2]) == ('Par', 'Amt') else h
-
+	nameMap = getFundMap()
+	return \
+	compose(
+		lambda name: nameMap[normalizeName(name)]
+	  , lambda name: lognRaise('fundNameToPortfolioId(): unsupported fund name {0}'.\
+	  							format(name)) if not normalizeName(name) in nameMap else name
+	)(name)
 
-	getHeaders = lambda line1, line2, line3: compose(
-		list
-	  , partial(map, toNewHeader)
-	  , zip
-	)(line1, line2, line3)
 
-	
-	toPosition = lambda headers, line: compose(
-		dict
-	  , partial(filterfalse, lambda t: t[0] == ('', '', ''))
-	  , partial(zip, headers)
-	  , lambda _, line: \
-	  		lognContinue('toPosition(): {0}'.format(line[0]), line)
-	)(headers, line)
 
+"""
+	[String] valuation period => [String] date (yyyy-mm-dd)
+	The valuation period looks like: 
+		'From 01/02/2020 to 29/02/2020'
+"""
+valuationPeriodToDate = compose(
+  	lambda s: datetime.strftime(datetime.strptime(s, '%d/%m/%Y'), '%Y-%m-%d')
+  , lambda s: s.split()[-1]
+)
 
-	countEmptyDictValue = lambda d: sum(1 if d[key] == '' else 0 for key in d)
-	unwantedPosition = lambda p: countEmptyDictValue(p) > 2
 
 
+def getPositionsFromSection(lines):
 	"""
-	In portfolio 12630, there are multiple entries for one position. We need to
-	group those together and create a consolidated position.
+	[Iterable] lines that belong to one section (a List, or a section from
+		getSections())
+		=> [Iterable] positions from that section
+
+	The section header and the three table header lines are read first,
+	the other lines are read only as the positions are consumed.
 	"""
-	toPositionGroups = partial(divideToGroup, lambda p: p['Description'] != '')
+	lines = iter(lines)
+	(header, line1, line2, line3) = islice(lines, 4)
+	toPosition = compileHeaders(line1, line2, line3)
+
+	# per row tracing is decided once for the whole section, so there is no
+	# per row logging cost unless it is switched on.
+	traceRows = isRowTraceEnabled() and logger.isEnabledFor(logging.DEBUG)
+	traceRow = lambda line: lognContinue('toPosition(): {0}', line, line[0])
+
+	# a position with more than 2 empty values is a sub total or blank line
+	unwantedPosition = lambda p: countOf(p.values(), '') > 2
 
 
 	return \
 	compose(
-		partial(map, partial(mergeDictionary, {'AssetType': getAssetType(lines[0][0])}))
-	  , partial(map, consolidatePositionGroup)
-	  , toPositionGroups
+		partial(map, partial(toRecord, getAssetType(header[0])))
+	  , consolidatePositions
 	  , partial(filterfalse, unwantedPosition)
-	  , partial( map
-	  		   , partial(toPosition, getHeaders(lines[1], lines[2], lines[3])))
-	  , lambda lines: lines[4:]
-	  , lambda lines: lognContinue( 'getPositionsFromSection(): {0}'.format(lines[0][0])
-	  							  , lines)
+	  , partial(map, toPosition)
+	  , partial(map, traceRow) if traceRows else (lambda lines: lines)
+	  , lambda lines: lognContinue('getPositionsFromSection(): {0}', lines, header[0])
 	)(lines)
 
 
 
-def consolidatePositionGroup(group):
+"""
+	[List] (asset type, keywords) pairs. A section is of that asset type if
+	its header contains all the keywords, the first match wins.
+"""
+assetTypeRules = \
+[ ('Cash', ('cash',))
+, ('Equity', ('equities',))
+, ('Accruals', ('accruals',))
+, ('HTMBond', ('debt securities', 'held for maturity'))
+, ('AFSBond', ('debt securities', 'available for sales'))
+, ('TradingBond', ('debt securities', 'held for trading'))
+]
+
+
+
+def getAssetType(sectionHeader):
+	"""
+	[String] section header (first cell in the first row of the section)
+		=> [String] asset type
+	"""
+	header = sectionHeader.lower()
+	for (assetType, keywords) in assetTypeRules:
+		if all(map(lambda k: k in header, keywords)):
+			return assetType
+
+	lognRaise('getAssetType(): unsupported asset type: {0}'.format(sectionHeader))
+
+
+
+"""
+	[Tuple] h (String, String, String) => [String] new header
+
+	The original header is a String tuple, to make it easier for viewing
+	and testing, we convert some of them to a single word. Actually for
+	the purpose of HTM price uploading, we only need to convert the column
+	for HTM amortized cost ('AmortizedPrice') column.
+"""
+toNewHeader = lambda h: \
+	'Description' if h[2].startswith('Description') else \
+	'Currency' if (h[0], h[2]) == ('', 'CCY') else \
+	'Cost' if (h[0], h[2]) == ('', 'Cost') else \
+	'MarketValue' if h in [('Total', 'Mkt', 'Value'), ('Total', 'M.', 'Value')] else \
+	'MarketPrice' if (h[1], h[2]) == ('Market', 'Price') else \
+	'AmortizedCost' if (h[1], h[2]) == ('Amortized', 'Price') else \
+	'Quantity' if (h[0], h[2]) == ('', 'Share') or (h[1], h[2]) == ('Par', 'Amt') else h
+
+
+
+def compileHeaders(line1, line2, line3):
 	"""
-	[List] group (a group of positions of the same security)
-		=> [Dictionary] consolidated position
+	[List] line1, line2, line3 (the three header lines of a section)
+		=> [Function] line => [Dictionary] position
 
-	NOTE: the result is not a truly consolidated position because it only adds
-	up the quantity and create a weighted average of the amortized cost (if any).
+	The headers are converted to (field name, column index) pairs once per
+	section, blank columns are left out. The returned function then picks
+	only those columns from each line.
 
-	This is good enough if we only need amortized cost of HTM bond positions and
-	can ignore other positions. Modification is needed if we need other positions
-	in the future.
+	When two columns have the same field name, the later column wins, the
+	same as building a dictionary from all the columns. A line shorter than
+	the headers (possible in .xlsx files) is taken as having empty cells at
+	the end, as xlrd gives for .xls files.
 	"""
-	position = group[0].copy()
+	columns = {}
+	for (index, h) in enumerate(zip(line1, line2, line3)):
+		if h != ('', '', ''):
+			columns[toNewHeader(h)] = index
+
+	columns = tuple(columns.items())
+	width = max(map(lambda c: c[1], columns), default=-1) + 1
+
+	def toPosition(line):
+		if len(line) >= width:
+			return {name: line[index] for (name, index) in columns}
+		else:
+			return {name: line[index] if index < len(line) else '' for (name, index) in columns}
+
+	return toPosition
+
+
 
+toRecord = lambda assetType, fields: Position(fields, AssetType=assetType)
+
+
+
+def consolidatePositions(positions):
+	"""
+	[Iterable] positions (of one section, in the order of the sheet)
+		=> [Iterable] consolidated positions
+
+	In portfolio 12630, there are multiple entries for one position, the
+	entries after the first one have an empty description. All entries of
+	a section are consolidated in one pass: quantity, cost and market value
+	are added up, amortized cost is averaged weighted by quantity. The
+	result is the first entry of each position, updated in place.
+	"""
+	first, totals = None, None
+	for p in positions:
+		if first == None or p['Description'] != '':
+			if first != None:
+				yield finishTotals(first, totals)
+			first, totals = p, newTotals(p)
+		else:
+			addToTotals(totals, p)
+
+	if first != None:
+		yield finishTotals(first, totals)
+
+
+
+# fields simply added up when a position has multiple entries
+summedFields = ('Cost', 'MarketValue')
+
+# an empty cell is taken as zero when adding up
+toNumber = lambda x: 0 if x == '' else x
+
+
+
+def newTotals(position):
+	"""
+	[Dictionary] position (the first entry) => [Dictionary] running totals
+	"""
+	totals = {'Entries': 1}
 	if 'Quantity' in position:
-		position['Quantity'] = sum(map(lambda p: p['Quantity'], group))
+		totals['Quantity'] = 0 + position['Quantity']
 		if 'AmortizedCost' in position:
-			position['AmortizedCost'] = \
-				sum(map( lambda p: p['Quantity']*p['AmortizedCost']
-					   , group)
-				   )/position['Quantity']
+			totals['Weighted'] = 0 + position['Quantity']*position['AmortizedCost']
+
+	for field in filter(lambda f: f in position, summedFields):
+		totals[field] = toNumber(position[field])
+
+	return totals
+
+
+
+def addToTotals(totals, position):
+	"""
+	[Dictionary] totals, [Dictionary] position (a following entry)
+		=> [Dictionary] totals, updated in place
+	"""
+	totals['Entries'] = totals['Entries'] + 1
+	if 'Quantity' in totals:
+		totals['Quantity'] = totals['Quantity'] + position['Quantity']
+		if 'Weighted' in totals:
+			totals['Weighted'] = totals['Weighted'] + \
+									position['Quantity']*position['AmortizedCost']
+
+	for field in filter(lambda f: f in totals, summedFields):
+		totals[field] = totals[field] + toNumber(position[field])
+
+	return totals
+
+
+
+def finishTotals(position, totals):
+	"""
+	[Dictionary] position (the first entry), [Dictionary] totals
+		=> [Dictionary] consolidated position, updated in place
+
+	Quantity and amortized cost are computed the same way for single entry
+	positions, so their values are the same as before consolidation moved
+	here. Cost and market value of a single entry are left as is.
+	"""
+	if 'Quantity' in totals:
+		if 'Weighted' in totals:
+			position['AmortizedCost'] = totals['Weighted']/totals['Quantity']
+		position['Quantity'] = totals['Quantity']
+
+	if totals['Entries'] > 1:
+		for field in filter(lambda f: f in totals, summedFields):
+			position[field] = totals[field]
 
 	return position
 
 
 
-"""
-	[String] file => [Iterable] lines
+def fileToLines(file, content=None):
+	"""
+	[String] file, [Bytes] content (optional, the file's content in memory)
+		=> [Iterable] lines
 
 	Read an Excel file, convert its first sheet into lines, each line is
-	a list of column values in that row.
-"""
-fileToLines = compose(
-	worksheetToLines
-  , lambda file: open_workbook(file).sheet_by_index(0)
-)
\ No newline at end of file
+	a list of column values in that row. The reader is chosen by file type,
+	.xlsx files are streamed by openpyxl, others are read by xlrd.
+
+	No line is read after the grand total line that ends the last section.
+	"""
+	return takeUntilTotal(
+		xlsxToLines(file, content) if file.lower().endswith('.xlsx') \
+		else xlsToLines(file, content)
+	)
+
+
+
+def xlsToLines(file, content=None):
+	"""
+	[String] file, [Bytes] content (optional) => [Iterable] lines
+
+	Only the first sheet is loaded (without formatting), and the workbook is
+	released as soon as the lines are consumed.
+	"""
+	wb = instrument.timeCall( 'open_workbook', open_workbook, file, on_demand=True
+							, file_contents=content)
+	try:
+		yield from instrument.timed('worksheetToLines', worksheetToLines(wb.sheet_by_index(0)))
+	finally:
+		wb.release_resources()
+
+
+
+def xlsxToLines(file, content=None):
+	"""
+	[String] file, [Bytes] content (optional) => [Iterable] lines
+
+	Stream the rows of the first sheet in read only mode, so memory use does
+	not grow with the size of the sheet. Cell values are converted to what
+	xlrd gives for the same cell, so the lines are the same as those from
+	an .xls file.
+	"""
+	from openpyxl import load_workbook	# only needed for .xlsx files
+	wb = instrument.timeCall( 'open_workbook', load_workbook
+							, file if content == None else BytesIO(content)
+							, read_only=True, data_only=True)
+	try:
+		ws = wb.worksheets[0]
+		width = ws.max_column or 0
+		for row in instrument.timed('worksheetToLines', ws.iter_rows(values_only=True)):
+			line = list(map(xlsxCellValue, row))
+			yield line + [''] * (width - len(line))
+	finally:
+		wb.close()
+
+
+
+def xlsxCellValue(value):
+	"""
+	[Object] cell value from openpyxl => [Object] cell value as xlrd gives it
+
+	Empty cells are '', numbers are float, dates are Excel serial numbers.
+	"""
+	if value == None:
+		return ''
+	elif isinstance(value, bool):
+		return int(value)
+	elif isinstance(value, (int, float)):
+		return float(value)
+	elif isinstance(value, date):		# a datetime is also a date
+		from openpyxl.utils.datetime import to_excel
+		return float(to_excel(value))
+	else:
+		return value
+
+
+
+def takeUntilTotal(lines):
+	"""
+	[Iterable] lines => [Iterable] lines up to and including the grand total
+		line, e.g., ['Total (總額)', '', ... ]
+	"""
+	for line in lines:
+		yield line
+		if isGrandTotalLine(line):
+			break
+
+
+
+isGrandTotalLine = lambda line: \
+	len(line) > 0 and isinstance(line[0], str) and line[0].startswith('Total (')
\ No newline at end of file
@@ -0,0 +1,14 @@
+# coding=utf-8
+#
+# Helpers shared by the test cases.
+#
+
+
+
+"""
+    [String] portfolio, [String] date, [String] ISIN, [Float] price
+        => [Dictionary] a USD HTM position of 1,000,000 par
+"""
+position = lambda portfolio, date, isin, price: \
+    { 'Portfolio': portfolio, 'Date': date, 'ISIN': isin, 'Currency': 'USD'
+    , 'Quantity': 1000000.0, 'AmortizedCost': price}
@@ -0,0 +1,51 @@
+# coding=utf-8
+#
+
+import unittest2
+from tempfile import TemporaryDirectory
+from trustee_report.report import readFile
+from trustee_report.cache import readThroughCache, pruneCache
+from trustee_report.utility import getCurrentDirectory
+from os import listdir
+from os.path import join
+
+
+
+class TestCache(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestCache, self).__init__(*args, **kwargs)
+
+
+
+    def testReadThroughCache(self):
+        inputFile = join(getCurrentDirectory(), 'samples', '05 cash multiple bond.xls')
+        parsed = []
+        def parse(file):
+            parsed.append(file)
+            return readFile(file)
+
+        with TemporaryDirectory() as directory:
+            positions = readThroughCache(directory, '1', parse, inputFile)
+            self.assertEqual(1, len(parsed))
+            self.assertEqual(list(readFile(inputFile)), positions)
+
+            # second read comes from the cache
+            self.assertEqual(positions, readThroughCache(directory, '1', parse, inputFile))
+            self.assertEqual(1, len(parsed))
+
+            # a new parser version does not use the old entry
+            readThroughCache(directory, '2', parse, inputFile)
+            self.assertEqual(2, len(parsed))
+            self.assertEqual(2, len(listdir(directory)))
+
+
+
+    def testPruneCache(self):
+        inputFile = join(getCurrentDirectory(), 'samples', '01 cash only.xls')
+        with TemporaryDirectory() as directory:
+            readThroughCache(directory, '1', readFile, inputFile)
+            readThroughCache(directory, '2', readFile, inputFile)
+            self.assertEqual(0, pruneCache(directory, 3600, 1024*1024))
+            self.assertEqual(2, pruneCache(directory, 3600, 0))
+            self.assertEqual([], listdir(directory))
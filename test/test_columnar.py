@@ -0,0 +1,56 @@
+# coding=utf-8
+#
+
+import unittest2
+from trustee_report.report import getHTMPositionsFromFiles
+from trustee_report.columnar import getHTMColumnsFromFiles, toColumns, decode, \
+                                    totalByPortfolioCurrency, consolidate
+from trustee_report.utility import getCurrentDirectory
+from os.path import join
+
+
+
+sampleFiles = lambda: \
+    [ join(getCurrentDirectory(), 'samples', f) for f in
+        [ '02 cash multiple bond.xls', '04 cash usd bond.xls', '05 cash multiple bond.xls'
+        , '06 multiple cash multiple bond.xls', '07 multiple cash multiple bond.xls']]
+
+
+
+class TestColumnar(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestColumnar, self).__init__(*args, **kwargs)
+
+
+
+    def testColumns(self):
+        columns = getHTMColumnsFromFiles(sampleFiles())
+        self.assertEqual(222, len(columns['Quantity']))
+        self.assertEqual( list(map(lambda p: p['ISIN'], getHTMPositionsFromFiles(sampleFiles())))
+                        , list(decode(columns, 'ISIN')))
+
+
+
+    def testTotalByPortfolioCurrency(self):
+        positions = list(getHTMPositionsFromFiles(sampleFiles()))
+        totals = totalByPortfolioCurrency(toColumns(positions))
+
+        for (portfolio, currency, total) in zip(totals['Portfolio'], totals['Currency'], totals['Sum']):
+            expected = sum( p['Quantity']*p['AmortizedCost']/100 for p in positions \
+                                if (p['Portfolio'], p['Currency']) == (portfolio, currency))
+            self.assertAlmostEqual(1, total/expected)
+
+        self.assertEqual( len(set((p['Portfolio'], p['Currency']) for p in positions))
+                        , len(totals['Sum']))
+
+
+
+    def testConsolidate(self):
+        positions = [ { 'Portfolio': '12630', 'Date': '2020-02-29', 'ISIN': 'US55608KAD72'
+                      , 'Currency': 'USD', 'AssetType': 'HTMBond', 'Quantity': q
+                      , 'AmortizedCost': a} for (q, a) in [(100000, 99), (246000, 100)]]
+        result = consolidate(toColumns(positions))
+        self.assertEqual(['US55608KAD72'], list(decode(result, 'ISIN')))
+        self.assertEqual(346000, result['Quantity'][0])
+        self.assertAlmostEqual((100000*99 + 246000*100)/346000, result['AmortizedCost'][0])
@@ -0,0 +1,142 @@
+# coding=utf-8
+#
+
+import unittest2
+from trustee_report.test.helper import position
+from trustee_report.duplicate import getUniqueHTMPositionsFromFiles, dropDuplicates, \
+                                    isConflict, orderFiles, keepFiles, \
+                                    getUniqueHTMPositionsAndErrorsFromFiles
+from trustee_report.incremental import runIncremental, loadManifest
+from trustee_report.report import getHTMPositionsFromFiles, getHTMPositionListsFromFiles
+from trustee_report.utility import getCurrentDirectory
+from tempfile import TemporaryDirectory
+from shutil import copy
+from os.path import join
+import os
+
+
+
+class TestDuplicate(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestDuplicate, self).__init__(*args, **kwargs)
+
+
+
+    def testDropDuplicates(self):
+        duplicates = []
+        positions = list(dropDuplicates(
+            [ ('b.xls', ('12630', '2020-02-29'), [ position('12630', '2020-02-29', 'XS0000000001', 100.5)])
+            , ('a.xls', ('12630', '2020-02-29'), [ position('12630', '2020-02-29', 'XS0000000001', 100.0)
+                                                 , position('12630', '2020-02-29', 'XS0000000002', 99.0)])
+            , ('c.xls', ('12630', '2020-03-31'), [ position('12630', '2020-03-31', 'XS0000000002', 99.0)])
+            ], duplicates))
+
+        # the whole of a.xls is dropped, including the bond b.xls does not have
+        self.assertEqual( [ position('12630', '2020-02-29', 'XS0000000001', 100.5)
+                          , position('12630', '2020-03-31', 'XS0000000002', 99.0)]
+                        , positions)
+        self.assertEqual( [ ('12630', '2020-02-29', 'XS0000000001', 'b.xls', 100.5, 'a.xls', 100.0)
+                          , ('12630', '2020-02-29', 'XS0000000002', 'b.xls', None, 'a.xls', 99.0)]
+                        , duplicates)
+        self.assertEqual([True, False], list(map(isConflict, duplicates)))
+
+
+
+    def testNoHTMPositions(self):
+        """
+        A corrected statement whose bonds are all gone still replaces the
+        older one.
+        """
+        duplicates = []
+        self.assertEqual( [('new.xls', ('12341', '2020-02-29'), [])]
+                        , list(keepFiles(
+                            [ ('new.xls', ('12341', '2020-02-29'), [])
+                            , ('old.xls', ('12341', '2020-02-29')
+                              , [position('12341', '2020-02-29', 'XS0000000001', 100.0)])
+                            ], duplicates)))
+        self.assertEqual( [('12341', '2020-02-29', 'XS0000000001', 'new.xls', None, 'old.xls', 100.0)]
+                        , duplicates)
+
+        # the portfolio and date come from the header of the file
+        inputFile = join(getCurrentDirectory(), 'samples', '01 cash only.xls')
+        for workers in [0, 2]:
+            self.assertEqual( [(inputFile, ('12341', '2020-02-29'), [])]
+                            , list(getHTMPositionListsFromFiles([inputFile], workers)))
+
+        with TemporaryDirectory() as directory:
+            manifestFile = join(directory, 'manifest.json')
+            self.assertEqual([], runIncremental([inputFile], manifestFile, 0, 'newest'))
+            entry = loadManifest(manifestFile)[inputFile]
+            self.assertEqual(('12341', '2020-02-29', {}), (entry['portfolio'], entry['date'], entry['prices']))
+
+
+
+    def testNewest(self):
+        sample = join(getCurrentDirectory(), 'samples', '02 cash multiple bond.xls')
+        with TemporaryDirectory() as directory:
+            old = copy(sample, join(directory, 'old.xls'))
+            new = copy(sample, join(directory, 'new.xls'))
+            os.utime(old, (1000000000, 1000000000))
+            self.assertEqual([new, old], orderFiles([old, new], 'newest'))
+            self.assertEqual([old, new], orderFiles([new, old], 'oldest'))
+
+            expected = list(getHTMPositionsFromFiles([sample]))
+            positions, duplicates = getUniqueHTMPositionsFromFiles([old, new], 'newest')
+            self.assertEqual(expected, list(positions))
+            self.assertEqual(len(expected), len(duplicates))
+            self.assertEqual([new], list(set(map(lambda d: d[3], duplicates))))
+            self.assertFalse(any(map(isConflict, duplicates)))
+
+            positions, duplicates = getUniqueHTMPositionsFromFiles([old, new], 'none')
+            self.assertEqual(2*len(expected), len(list(positions)))
+            self.assertEqual([], duplicates)
+
+
+
+    def testKeepGoing(self):
+        samples = join(getCurrentDirectory(), 'samples')
+        with TemporaryDirectory() as directory:
+            old = copy(join(samples, '05 cash multiple bond.xls'), directory)
+            new = copy(join(samples, '05 cash multiple bond.xls'), join(directory, '05 resent.xls'))
+            bad = copy(join(samples, 'wrong fund name.xls'), directory)
+            os.utime(old, (1000000000, 1000000000))
+
+            positions, duplicates, errors = \
+                getUniqueHTMPositionsAndErrorsFromFiles([old, bad, new], 'newest')
+            self.assertEqual(51, len(positions))
+            self.assertEqual(51, len(duplicates))
+            self.assertEqual({(new, old)}, set(map(lambda d: (d[3], d[5]), duplicates)))
+            self.assertEqual([bad], list(map(lambda e: e.file, errors)))
+
+            positions, duplicates, errors = \
+                getUniqueHTMPositionsAndErrorsFromFiles([old, bad, new], 'none')
+            self.assertEqual(102, len(positions))
+            self.assertEqual([], duplicates)
+
+
+
+    def testIncremental(self):
+        samples = join(getCurrentDirectory(), 'samples')
+        with TemporaryDirectory() as directory:
+            manifestFile = join(directory, 'manifest.json')
+            old = copy(join(samples, '05 cash multiple bond.xls'), directory)
+            os.utime(old, (1000000000, 1000000000))
+            duplicates = []
+            self.assertEqual(51, len(runIncremental([old], manifestFile, 0, 'newest', duplicates)))
+            self.assertEqual([], duplicates)
+
+            # sent again, the new file is kept, the old one dropped
+            new = copy(join(samples, '05 cash multiple bond.xls'), join(directory, '05 resent.xls'))
+            self.assertEqual([], runIncremental([old, new], manifestFile, 0, 'newest', duplicates))
+            self.assertEqual(51, len(duplicates))
+            self.assertEqual({(new, old)}, set(map(lambda d: (d[3], d[5]), duplicates)))
+            manifest = loadManifest(manifestFile)
+            self.assertTrue(manifest[old]['dropped'])
+            self.assertFalse(manifest[new]['dropped'])
+
+            # the old one kept, the new one is not output
+            os.remove(manifestFile)
+            duplicates = []
+            self.assertEqual(51, len(runIncremental([old, new], manifestFile, 0, 'oldest', duplicates)))
+            self.assertEqual({(old, new)}, set(map(lambda d: (d[3], d[5]), duplicates)))
@@ -3,7 +3,9 @@
 
 import unittest2
 from xlrd import open_workbook
-from trustee_report.report import readFile
+from trustee_report.report import readFile, getHTMPositionsFromFiles, \
+                                    getHTMPositionsAndErrorsFromFiles, \
+                                    getHTMPositionListsFromFiles, ParseError
 from trustee_report.utility import getCurrentDirectory
 from os.path import join
 
@@ -34,4 +36,28 @@ class TestError(unittest2.TestCase):
         except:
             pass    # expected: fund name not found
         else:
-            self.fail('Error should occur, but didn\'t')
\ No newline at end of file
+            self.fail('Error should occur, but didn\'t')
+
+
+    def testBatch(self):
+        files = list(map( lambda f: join(getCurrentDirectory(), 'samples', f)
+                        , [ '02 cash multiple bond.xls', 'wrong fund name.xls'
+                          , 'missing fund name.xls', '05 cash multiple bond.xls']))
+        positions, errors = getHTMPositionsAndErrorsFromFiles(files)
+        self.assertEqual( len(list(getHTMPositionsFromFiles([files[0], files[3]])))
+                        , len(positions))
+        self.assertEqual(files[1:3], list(map(lambda e: e.file, errors)))
+        self.assertTrue(errors[0].line > 0)
+        self.assertTrue('HAHAHA' in errors[0].reason)
+
+
+
+    def testParseErrorFromLists(self):
+        inputFile = join(getCurrentDirectory(), 'samples', 'wrong fund name.xls')
+        for workers in [0, 2]:
+            with self.assertRaises(ParseError) as context:
+                list(getHTMPositionListsFromFiles([inputFile], workers))
+
+            self.assertEqual(inputFile, context.exception.file)
+            self.assertTrue(context.exception.line > 0)
+            self.assertTrue('HAHAHA' in context.exception.reason)
@@ -0,0 +1,64 @@
+# coding=utf-8
+#
+
+import unittest2
+from trustee_report.test.helper import position
+from trustee_report.history import appendPositions, openStore, getHistory, \
+                                    getMonthOverMonth, getDateDiff
+from tempfile import TemporaryDirectory
+from os.path import join
+
+
+
+class TestHistory(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestHistory, self).__init__(*args, **kwargs)
+
+
+
+    def testHistory(self):
+        with TemporaryDirectory() as directory:
+            file = join(directory, 'history.db')
+            positions = [ position('12630', '2020-01-31', 'XS0000000001', 100.0)
+                        , position('12630', '2020-01-31', 'XS0000000002', 98.0)
+                        , position('12630', '2020-02-29', 'XS0000000001', 100.5)
+                        , position('12630', '2020-03-31', 'XS0000000001', 100.25)
+                        , position('12229', '2020-02-29', 'XS0000000001', 90.0)
+                        ]
+            self.assertEqual(positions, list(appendPositions(file, positions)))
+
+            # read again, replaces the price
+            list(appendPositions(file, [position('12630', '2020-03-31', 'XS0000000001', 101.0)]))
+
+            connection = openStore(file)
+            self.assertEqual( [ ('2020-01-31', 1000000.0, 100.0)
+                              , ('2020-02-29', 1000000.0, 100.5)
+                              , ('2020-03-31', 1000000.0, 101.0)]
+                            , getHistory(connection, '12630', 'XS0000000001'))
+
+            result = getMonthOverMonth(connection, '12630', 'XS0000000001', '2020-02-01')
+            self.assertEqual(2, len(result))
+            self.assertEqual(('2020-02-29', 100.5, 100.0, 0.5), result[0])
+            self.assertEqual(('2020-03-31', 101.0, 100.5, 0.5), result[1])
+
+            self.assertEqual( [ ('XS0000000001', 100.0, 100.5, 0.5)
+                              , ('XS0000000002', 98.0, None, None)]
+                            , getDateDiff(connection, '12630', '2020-01-31', '2020-02-29'))
+            connection.close()
+
+
+
+    def testFailedRun(self):
+        def positions():
+            yield position('12630', '2020-01-31', 'XS0000000001', 100.0)
+            raise ValueError('bad file')
+
+        with TemporaryDirectory() as directory:
+            file = join(directory, 'history.db')
+            with self.assertRaises(ValueError):
+                list(appendPositions(file, positions()))
+
+            connection = openStore(file)
+            self.assertEqual([], getHistory(connection, '12630', 'XS0000000001'))
+            connection.close()
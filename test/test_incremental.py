@@ -0,0 +1,48 @@
+# coding=utf-8
+#
+
+import unittest2
+from trustee_report.incremental import runIncremental, loadManifest
+from trustee_report.utility import getCurrentDirectory
+from tempfile import TemporaryDirectory
+from shutil import copy
+from os.path import join
+
+
+
+sampleFile = lambda f: join(getCurrentDirectory(), 'samples', f)
+
+
+
+class TestIncremental(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestIncremental, self).__init__(*args, **kwargs)
+
+
+
+    def testIncremental(self):
+        with TemporaryDirectory() as directory:
+            manifestFile = join(directory, 'manifest.json')
+            files = [ copy(sampleFile('02 cash multiple bond.xls'), directory)
+                    , copy(sampleFile('03 cash equity.xls'), directory)]
+
+            self.assertEqual(11, len(runIncremental(files, manifestFile)))
+            manifest = loadManifest(manifestFile)
+            self.assertEqual(2, len(manifest))
+            self.assertEqual('12630', manifest[files[0]]['portfolio'])
+            self.assertEqual('2020-02-29', manifest[files[0]]['date'])
+
+            # nothing changed
+            self.assertEqual([], runIncremental(files, manifestFile))
+
+            # a new file
+            files.append(copy(sampleFile('05 cash multiple bond.xls'), directory))
+            delta = runIncremental(files, manifestFile)
+            self.assertEqual(51, len(delta))
+            self.assertEqual({'12366'}, set(map(lambda p: p['Portfolio'], delta)))
+
+            # the same statement under another name, no price changed
+            files.append(copy(sampleFile('05 cash multiple bond.xls'), join(directory, 'resent.xls')))
+            self.assertEqual([], runIncremental(files, manifestFile))
+            self.assertEqual(4, len(loadManifest(manifestFile)))
@@ -0,0 +1,46 @@
+# coding=utf-8
+#
+
+import unittest2
+from trustee_report.report import readFile
+from trustee_report.utility import getCurrentDirectory
+from trustee_report import instrument
+from os.path import join
+
+
+
+class TestInstrument(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestInstrument, self).__init__(*args, **kwargs)
+
+
+
+    def tearDown(self):
+        instrument.disable()
+        instrument.reset()
+
+
+
+    def testDisabled(self):
+        inputFile = join(getCurrentDirectory(), 'samples', '01 cash only.xls')
+        self.assertEqual(4, len(list(readFile(inputFile))))
+        self.assertEqual({}, dict(instrument.stats['files']))
+        self.assertEqual({}, dict(instrument.stats['stages']))
+
+
+
+    def testCounters(self):
+        instrument.enable()
+        inputFile = join(getCurrentDirectory(), 'samples', '06 multiple cash multiple bond.xls')
+        positions = list(readFile(inputFile))
+
+        fileStats = instrument.stats['files'][inputFile]
+        self.assertEqual(188, fileStats['rows'])
+        self.assertEqual(9, fileStats['sections'])
+        self.assertEqual(len(positions), fileStats['positions'])
+        self.assertEqual(len(positions), instrument.stats['portfolios']['12229']['positions'])
+
+        for stage in ['open_workbook', 'worksheetToLines', 'getSections'
+                     , 'getPositionsFromSection', 'readFile']:
+            self.assertTrue(instrument.stats['stages'][stage]['seconds'] > 0)
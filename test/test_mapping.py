@@ -0,0 +1,51 @@
+# coding=utf-8
+#
+
+import unittest2
+from trustee_report.mapping import loadMappings, normalizeName, getFundMap, getIsinMap
+from trustee_report.report import fundNameToPortfolioId
+from tempfile import TemporaryDirectory
+from os.path import join
+
+
+
+class TestMapping(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestMapping, self).__init__(*args, **kwargs)
+
+
+
+    def testDefaultMappings(self):
+        self.assertEqual(8, len(getFundMap()))
+        self.assertEqual('HK0000175916', getIsinMap()['DBANFB12014'])
+        with self.assertRaises(TypeError):
+            getIsinMap()['XS0000000000'] = 'XS0000000000'
+
+
+
+    def testFundName(self):
+        self.assertEqual('12734', fundNameToPortfolioId('CLT-CLI HK BR (Class A-HK) Trust Fund  (Bond)'))
+        self.assertEqual('12734', fundNameToPortfolioId(' clt-cli hk br (class a-hk) trust fund (bond)'))
+        self.assertEqual('clt-cli hk br (class a-hk) trust fund (bond)'
+                        , normalizeName('CLT-CLI HK BR (Class A-HK)  Trust Fund\t(Bond) '))
+        with self.assertRaises(ValueError):
+            fundNameToPortfolioId('CLT-CLI HK BR (Class A-HK) Trust Fund (Equity)')
+
+
+
+    def testLoadMappings(self):
+        with TemporaryDirectory() as directory:
+            file = join(directory, 'mapping.config')
+            with open(file, 'w') as f:
+                f.write( '[fund]\nNew  Fund = 99999\nFund: Class B = 88888\n\n'
+                       + '[isin]\nABC123 = XS0000000001\n')
+
+            (fundMap, isinMap, version) = loadMappings(file)
+            self.assertEqual({'new fund': '99999', 'fund: class b': '88888'}, dict(fundMap))
+            self.assertEqual({'ABC123': 'XS0000000001'}, dict(isinMap))
+
+            with open(file, 'a') as f:
+                f.write('DEF456 = XS0000000002\n')
+
+            self.assertNotEqual(version, loadMappings(file)[2])
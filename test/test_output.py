@@ -0,0 +1,70 @@
+# coding=utf-8
+#
+
+import unittest2
+from trustee_report.test.helper import position
+from trustee_report.main import outputCsv
+from tempfile import TemporaryDirectory
+import os, csv
+
+
+
+class TestOutput(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestOutput, self).__init__(*args, **kwargs)
+
+
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = TemporaryDirectory()
+        os.chdir(self.directory.name)
+
+
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+
+
+    def testPartitionByDate(self):
+        positions = iter([ position('12229', '2020-02-29', 'XS0000000001', 100.5)
+                         , position('12734', '2020-03-31', 'XS0000000002', 99.0)
+                         , position('12734', '2020-02-29', 'XS0000000003', 98.0)
+                         ])
+        files = outputCsv(positions, byPortfolio=False)
+        self.assertEqual( ['f3321tscf.htm.2020-02-29.inc', 'f3321tscf.htm.2020-03-31.inc']
+                        , files)
+
+        with open(files[0], newline='') as f:
+            rows = list(csv.reader(f))
+
+        self.assertEqual(4, len(rows))
+        self.assertEqual(['Upload Method', 'INCREMENTAL', '', '', '', ''], rows[0])
+        self.assertEqual(['CD012', '4', 'XS0000000001', '12229', '100.5', '100.5'], rows[2])
+        self.assertEqual('XS0000000003', rows[3][2])
+
+
+
+    def testPartitionByPortfolio(self):
+        positions = [ position('12229', '2020-02-29', 'XS0000000001', 100.5)
+                    , position('12734', '2020-02-29', 'XS0000000002', 99.0)
+                    ]
+        self.assertEqual( [ 'f3321tscf.htm.2020-02-29.12229.inc'
+                          , 'f3321tscf.htm.2020-02-29.12734.inc']
+                        , outputCsv(positions, byPortfolio=True))
+        self.assertEqual([], outputCsv([], byPortfolio=True))
+
+
+
+    def testError(self):
+        def positions():
+            yield position('12229', '2020-02-29', 'XS0000000001', 100.5)
+            raise ValueError('bad file')
+
+        with self.assertRaises(ValueError):
+            outputCsv(positions(), byPortfolio=False)
+
+        self.assertEqual([], os.listdir('.'))
@@ -0,0 +1,58 @@
+# coding=utf-8
+#
+
+import unittest2
+from trustee_report.prefetch import readAhead
+from trustee_report.report import readFile
+from trustee_report.utility import getCurrentDirectory
+from os.path import join, getsize
+
+
+
+sampleFile = lambda f: join(getCurrentDirectory(), 'samples', f)
+
+
+
+class TestPrefetch(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestPrefetch, self).__init__(*args, **kwargs)
+
+
+
+    def testReadAhead(self):
+        files = list(map(sampleFile, [ '01 cash only.xls', '02 cash multiple bond.xls'
+                                     , '03 cash equity.xls']))
+        result = list(readAhead(files, 2, 10*1024*1024))
+        self.assertEqual(files, list(map(lambda t: t[0], result)))
+        with open(files[1], 'rb') as f:
+            self.assertEqual(f.read(), result[1][1])
+
+        # no read ahead
+        self.assertEqual( [(f, None) for f in files]
+                        , list(readAhead(files, 0, 10*1024*1024)))
+
+        # the second file does not fit in the budget
+        budget = getsize(files[0]) + getsize(files[1]) - 1
+        result = list(readAhead(files, 2, budget))
+        self.assertTrue(result[0][1] != None)
+        self.assertEqual(None, result[1][1])
+        self.assertTrue(result[2][1] != None)
+
+        # the file handed out counts until the next one is asked for
+        budget = max(map(getsize, files))
+        result = list(readAhead(files, 1, budget))
+        self.assertEqual([True, False, True], list(map(lambda t: t[1] != None, result)))
+
+        # a missing file is left to the caller
+        self.assertEqual( [('no such file.xls', None)]
+                        , list(readAhead(['no such file.xls'], 2, 1024)))
+
+
+
+    def testContent(self):
+        inputFile = sampleFile('06 multiple cash multiple bond.xls')
+        with open(inputFile, 'rb') as f:
+            content = f.read()
+
+        self.assertEqual(list(readFile(inputFile)), list(readFile(inputFile, content=content)))
@@ -3,11 +3,15 @@
 
 import unittest2
 from xlrd import open_workbook
-from trustee_report.report import readFile, getHTMPositionsFromFiles
+from trustee_report.report import readFile, getHTMPositionsFromFiles, fileToLines, \
+                                    readHeader, getPortfolioIdFromHeader, getDateFromHeader, \
+                                    probe, classifyRows, getSections, getPositionsFromSection, \
+                                    EmptyRow, SectionHeaderRow, DataRow
 from trustee_report.utility import getCurrentDirectory
 from toolz.functoolz import compose, flip
 from functools import partial, reduce
 from utils.iter import firstOf
+from tempfile import TemporaryDirectory
 from os.path import join
 
 
@@ -149,6 +153,120 @@ class TestAll(unittest2.TestCase):
 
 
 
+    def testParallel(self):
+        files = compose(
+            list
+          , partial(map, lambda f: join(getCurrentDirectory(), 'samples', f))
+        )([ '02 cash multiple bond.xls', '05 cash multiple bond.xls'
+          , '06 multiple cash multiple bond.xls', '07 multiple cash multiple bond.xls'])
+
+        sequential = list(getHTMPositionsFromFiles(files))
+        parallel = list(getHTMPositionsFromFiles(files, workers=2))
+        self.assertEqual(211, len(parallel))
+        self.assertEqual(sequential, parallel)
+
+
+
+    def testXlsxFile(self):
+        """
+        Save a sample file as .xlsx, it should give the same positions.
+        """
+        from openpyxl import Workbook
+        inputFile = join(getCurrentDirectory(), 'samples', '05 cash multiple bond.xls')
+        wb = Workbook()
+        for line in fileToLines(inputFile):
+            wb.active.append(line)
+
+        with TemporaryDirectory() as directory:
+            xlsxFile = join(directory, '05 cash multiple bond.xlsx')
+            wb.save(xlsxFile)
+            positions = list(readFile(xlsxFile))
+
+        expected = list(readFile(inputFile))
+        self.assertEqual(len(expected), len(positions))
+        self.assertEqual( list(map(lambda p: p['Description'], expected))
+                        , list(map(lambda p: p['Description'], positions)))
+        self.verifyUSDHTMBondPosition(
+            firstOf( lambda p: p['AssetType'] == 'HTMBond' and p['Currency'] == 'USD'
+                   , positions))
+
+
+
+    def testHeaderOrder(self):
+        """
+        Valuation period before fund name, the header is still read, and
+        the lines after start from the first section header.
+        """
+        lines = [ ['', 'PORTFOLIO VALUATION REPORT']
+                , ['Valuation Period: From 01/02/2020 to 29/02/2020']
+                , ['Fund Name: CLI Macau BR (Fund)']
+                , ['I. Cash - HKD (現金 - 港幣)']
+                , ['Description', 'CCY']
+                ]
+        header, rest = readHeader(lines)
+        self.assertEqual('12298', getPortfolioIdFromHeader(header))
+        self.assertEqual('2020-02-29', getDateFromHeader(header))
+        self.assertEqual(lines[3:], list(rest))
+
+
+
+    def testClassifyRows(self):
+        """
+        Empty lines between the section header and the table header are
+        left out of the section, so the table header is still read.
+        """
+        empty = [''] * 13
+        lines = [ ['VIII. Debt Securities - USD Held for Maturity'] + [''] * 12
+                , empty
+                , ['', '', '', '', '票面值', '', '', '攤銷後', '', '', '總攤銷值', '', '']
+                , ['項目', '', '幣值', '', 'Par', '', 'Avg', 'Amortized', '', '成本', 'Total', '', '% of']
+                , empty
+                , [ 'Description', '', 'CCY', '', 'Amt', '', 'Cost ', 'Price', '', 'Cost'
+                  , 'Value', '', 'Fund']
+                , [ 'XS0000000001 BOND', '', 'USD', '', 1000000.0, '', 99.5, 100.2, ''
+                  , 995000.0, 1000000.0, '', 0.001]
+                , empty
+                , ['I. Cash - HKD (現金 - 港幣)'] + [''] * 12
+                ]
+        self.assertEqual( [ SectionHeaderRow, EmptyRow, DataRow, DataRow, EmptyRow
+                          , DataRow, DataRow, EmptyRow, SectionHeaderRow]
+                        , list(map(lambda r: r[0], classifyRows(lines))))
+        self.assertEqual(lines, list(map(lambda r: r[1], classifyRows(lines))))
+
+        sections = list(map(list, getSections(lines)))
+        self.assertEqual([lines[0], lines[2], lines[3], lines[5], lines[6]], sections[0])
+        self.assertEqual([lines[8]], sections[1])
+
+        positions = list(getPositionsFromSection(sections[0]))
+        self.assertEqual(1, len(positions))
+        self.assertEqual('HTMBond', positions[0]['AssetType'])
+        self.assertAlmostEqual(100.2, positions[0]['AmortizedCost'])
+
+
+
+    def testAssetTypes(self):
+        inputFile = join(getCurrentDirectory(), 'samples', '06 multiple cash multiple bond.xls')
+        expected = list(filter(lambda p: p['AssetType'] == 'HTMBond', readFile(inputFile)))
+        positions = list(readFile(inputFile, ('HTMBond',)))
+        self.assertEqual(expected, positions)
+        self.assertEqual(75, len(positions))
+
+        positions = list(readFile(inputFile, ('Cash', 'Accruals')))
+        self.assertEqual( {'Cash', 'Accruals'}
+                        , set(map(lambda p: p['AssetType'], positions)))
+
+
+
+    def testProbe(self):
+        inputFile = join(getCurrentDirectory(), 'samples', '06 multiple cash multiple bond.xls')
+        self.assertEqual(('12229', '2020-02-29', inputFile), probe(inputFile))
+
+        inputFile = join(getCurrentDirectory(), 'samples', 'wrong fund name.xls')
+        with self.assertRaises(ValueError):
+            probe(inputFile)
+
+
+
     def verifyCashPosition(self, p):
         self.assertEqual('USD', p['Currency'])
         self.assertEqual('12341', p['Portfolio'])
@@ -209,7 +327,7 @@ class TestAll(unittest2.TestCase):
         self.assertEqual('2020-02-29', p['Date'])
         self.assertEqual('US55608KAD72 MACQUARIE GROUP', p['Description'])
         self.assertEqual(346000, p['Quantity'])             # total quantity
-        self.assertAlmostEqual(219649.02, p['Cost'])        # cost of the first
+        self.assertAlmostEqual(343164.78, p['Cost'])        # total cost
         self.assertAlmostEqual(99.8985, p['AmortizedCost'], 4)   # weighted average
 
 
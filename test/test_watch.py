@@ -0,0 +1,39 @@
+# coding=utf-8
+#
+
+import unittest2
+from trustee_report.watch import scanDirectory, readyFiles
+from tempfile import TemporaryDirectory
+from os.path import join
+
+
+
+class TestWatch(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestWatch, self).__init__(*args, **kwargs)
+
+
+
+    def testScanDirectory(self):
+        with TemporaryDirectory() as directory:
+            for f in ['a.xls', 'b.xlsx', 'c.txt']:
+                with open(join(directory, f), 'w') as fh:
+                    fh.write('abc')
+
+            scan = scanDirectory(directory)
+            self.assertEqual( sorted([join(directory, 'a.xls'), join(directory, 'b.xlsx')])
+                            , sorted(scan))
+            self.assertEqual(3, scan[join(directory, 'a.xls')][0])
+
+
+
+    def testReadyFiles(self):
+        lastScan = {'a.xls': (10, 100.0), 'b.xls': (10, 100.0)}
+        scan = { 'a.xls': (10, 100.0)   # unchanged
+               , 'b.xls': (20, 104.0)   # still being written
+               , 'c.xls': (10, 90.0)    # new, not seen before
+               }
+        self.assertEqual(['a.xls'], readyFiles(lastScan, scan, 106.0, 5))
+        self.assertEqual([], readyFiles(lastScan, scan, 102.0, 5))
+        self.assertEqual(['a.xls', 'b.xls', 'c.xls'], readyFiles(scan, scan, 110.0, 5))
@@ -48,4 +48,164 @@ def getInputDirectory():
 
 def getOutputDirectory():
 	global config
-	return config['directory']['output']
\ No newline at end of file
+	return config['directory']['output']
+
+
+
+def getWorkers():
+	"""
+	Number of worker processes to parse input files, 0 means no parallel
+	parsing.
+	"""
+	global config
+	return config.getint('parallel', 'workers', fallback=0)
+
+
+
+def isCacheEnabled():
+	global config
+	return config.getboolean('cache', 'enabled', fallback=False)
+
+
+
+def getCacheDirectory():
+	global config
+	return config.get('cache', 'directory', fallback='cache')
+
+
+
+def getCacheMaxAge():
+	"""
+	Maximum age of a parse cache entry, in seconds.
+	"""
+	global config
+	return config.getfloat('cache', 'max_age_days', fallback=90)*24*3600
+
+
+
+def getCacheMaxSize():
+	"""
+	Maximum size of the parse cache, in bytes.
+	"""
+	global config
+	return int(config.getfloat('cache', 'max_size_mb', fallback=200)*1024*1024)
+
+
+
+def isRowTraceEnabled():
+	"""
+	Whether to log every row parsed, at debug level.
+	"""
+	global config
+	return config.getboolean('debug', 'trace_rows', fallback=False)
+
+
+
+def getManifestFile():
+	"""
+	The file that records input files already processed in incremental mode.
+	"""
+	global config
+	return config.get('incremental', 'manifest', fallback='manifest.json')
+
+
+
+def getWatchInterval():
+	"""
+	Seconds between two scans of the input directory in watch mode.
+	"""
+	global config
+	return config.getfloat('watch', 'interval', fallback=2)
+
+
+
+def getWatchSettle():
+	"""
+	Seconds a file must stay unchanged before it is parsed in watch mode.
+	"""
+	global config
+	return config.getfloat('watch', 'settle', fallback=5)
+
+
+
+def getMappingFile():
+	"""
+	The file of fund name and ISIN lookups, relative to this directory.
+	"""
+	global config
+	return os.path.join( getCurrentDirectory()
+					   , config.get('mapping', 'file', fallback='mapping.config'))
+
+
+
+def getErrorReportFile():
+	"""
+	The file to list files that fail in 'python main.py --keep-going'.
+	"""
+	global config
+	return config.get('batch', 'error_report', fallback='errors.csv')
+
+
+
+def isOutputByPortfolio():
+	"""
+	Whether to write one upload file per portfolio, besides per valuation date.
+	"""
+	global config
+	return config.getboolean('output', 'by_portfolio', fallback=False)
+
+
+
+def getPrefetchDepth():
+	"""
+	Number of input files to read ahead on background threads, while the
+	current file is parsed, 0 means no read ahead.
+	"""
+	global config
+	return config.getint('prefetch', 'depth', fallback=2)
+
+
+
+def getPrefetchMemory():
+	"""
+	Maximum total size of the files read ahead, in bytes.
+	"""
+	global config
+	return int(config.getfloat('prefetch', 'memory_mb', fallback=64)*1024*1024)
+
+
+
+def isHistoryEnabled():
+	"""
+	On unless switched off in the config file.
+	"""
+	global config
+	return config.getboolean('history', 'enabled', fallback=True)
+
+
+
+def getHistoryFile():
+	"""
+	The SQLite database of HTM price history.
+	"""
+	global config
+	return config.get('history', 'file', fallback='history.db')
+
+
+
+def getDuplicatePolicy():
+	"""
+	Which file to keep when files are for the same portfolio and date:
+	newest, oldest, first, last or none (keep all).
+	"""
+	global config
+	return config.get('duplicate', 'keep', fallback='newest')
+
+
+
+def getDuplicateReportFile():
+	"""
+	The file to list positions of the files dropped as duplicates.
+	"""
+	global config
+	return config.get('duplicate', 'report', fallback='duplicates.csv')
@@ -0,0 +1,42 @@
+# coding=utf-8
+#
+# Helpers to watch the input directory for statements, by polling. A file
+# is ready to be parsed once it stops changing, so that a file still being
+# copied over is not read half written.
+#
+import os
+
+
+
+"""
+	[String] file name => [Bool] is it a statement (an excel file), the same
+		for all run modes
+"""
+isInputFile = lambda fn: fn.endswith('.xls') or fn.endswith('.xlsx')
+
+
+
+def scanDirectory(directory):
+	"""
+	[String] directory => [Dictionary] file => (size, modified time), for the
+		excel files directly under the directory.
+	"""
+	result = {}
+	for entry in os.scandir(directory):
+		if entry.is_file() and isInputFile(entry.name):
+			stat = entry.stat()
+			result[entry.path] = (stat.st_size, stat.st_mtime)
+
+	return result
+
+
+
+def readyFiles(lastScan, scan, now, settle):
+	"""
+	[Dictionary] lastScan, [Dictionary] scan (results of scanDirectory())
+	[Float] now (time), [Float] settle (seconds)
+		=> [List] files in both scans with the same size and modified time,
+			and not modified for at least settle seconds, sorted by name.
+	"""
+	return sorted(filter( lambda f: lastScan.get(f) == scan[f] and now - scan[f][1] >= settle
+						, scan))